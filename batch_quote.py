@@ -0,0 +1,223 @@
+import argparse, csv, json, math, os, sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from zipindex import default_zip_index
+from models import Deal, TradeIn, QuoteGrid
+from money import to_cents, from_cents
+from utils import taxes_cents_array, deal_taxes_cents, deal_balance_cents, deal_payment_grid_cents, ordered_imap
+
+DEFAULTS = {
+    "discount": 0.0,
+    "rebate": 0.0,
+    "trade_value": 0.0,
+    "trade_payoff": 0.0,
+    "state": "",
+    "doc_fee": 799.00,
+    "non_tax_fees": 125.00,
+    "terms": [36, 60, 72],
+    "down_payments": [1000.00, 2000.00, 3000.00],
+}
+FINANCE_RATE = 14.0
+LEASE_MONEY_FACTOR = 0.00275
+LEASE_RESIDUAL = 0.70
+LIST_FIELDS = ("terms", "rates", "down_payments", "residuals")
+NUMBER_FIELDS = ("market_value", "discount", "rebate", "trade_value", "trade_payoff", "doc_fee", "non_tax_fees")
+OUTPUT_FIELDS = ["id", "type", "state", "taxes", "balance", "term", "rate", "residual", "down_payment", "payment"]
+
+def parse_number(value):
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"not a finite number: {value!r}")
+    return number
+
+def parse_list(value):
+    if isinstance(value, list):
+        return [parse_number(v) for v in value]
+    return [parse_number(v) for v in str(value).replace("|", ";").split(";") if v.strip()]
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "lease")
+
+def normalize_deal(raw, row_num, default_lease=False):
+    values = dict(DEFAULTS)
+    for key, value in raw.items():
+        if value is None or value == "":
+            continue
+        values[key] = value
+    if "market_value" not in values and "price" in values:
+        values["market_value"] = values["price"]
+    county = str(values.get("county") or "")
+    if values.get("zip") and not values["state"]:
+        info = default_zip_index().lookup(values["zip"])
+        if info is not None:
+            values["state"] = info.state
+            county = county or info.county
+    lease = parse_bool(values.get("lease", default_lease))
+    for key in NUMBER_FIELDS:
+        values[key] = parse_number(values.get(key) or 0)
+    for key in LIST_FIELDS:
+        if key in values:
+            values[key] = parse_list(values[key])
+    terms = values["terms"]
+    if "rates" not in values:
+        values["rates"] = [LEASE_MONEY_FACTOR if lease else FINANCE_RATE] * len(terms)
+    if lease and "residuals" not in values:
+        values["residuals"] = [LEASE_RESIDUAL] * len(terms)
+    for key in ("rates", "residuals") if lease else ("rates",):
+        if len(values[key]) != len(terms):
+            raise ValueError(f"{key} has {len(values[key])} values for {len(terms)} terms")
+    deal = Deal(
+        deal_id=values.get("id", row_num), state=str(values["state"]), county=county, zipcode=str(values.get("zip") or ""),
+        market_value=values["market_value"], discount=values["discount"], rebate=values["rebate"], doc_fee=values["doc_fee"],
+        non_tax_fees=values["non_tax_fees"], trades=(TradeIn(value=values["trade_value"], payoff=values["trade_payoff"]),), lease=lease,
+    )
+    return deal, QuoteGrid(terms, values["rates"], values["down_payments"], values.get("residuals"))
+
+def price_deal(deal, grid, taxes=None):
+    # taxes, balance and payments stay in cents until they are written out.
+    taxes = deal_taxes_cents(deal) if taxes is None else taxes
+    deal.taxes = from_cents(taxes)
+    balance = deal_balance_cents(deal, taxes)
+    payments = from_cents(deal_payment_grid_cents(deal, grid, balance))
+    rows = []
+    for i, row in enumerate(payments.tolist()):
+        for j, payment in enumerate(row):
+            rows.append({
+                "id": deal.deal_id,
+                "type": "lease" if deal.lease else "finance",
+                "state": deal.state,
+                "taxes": deal.taxes,
+                "balance": from_cents(balance),
+                "term": int(grid.terms[i]),
+                "rate": grid.rates[i],
+                "residual": grid.residuals[i] if deal.lease else "",
+                "down_payment": grid.down_payments[j],
+                "payment": payment,
+            })
+    return rows
+
+def chunk_taxes(deals):
+    counties = [deal.county for deal in deals]
+    zipcodes = [deal.zipcode for deal in deals]
+    return taxes_cents_array(
+        [deal.state for deal in deals],
+        to_cents([deal.market_value for deal in deals]),
+        to_cents([deal.discount for deal in deals]),
+        to_cents([deal.doc_fee for deal in deals]),
+        to_cents([deal.trade_value for deal in deals]),
+        counties if any(counties) else None,
+        zipcodes if any(zipcodes) else None,
+    ).tolist()
+
+def price_chunk(chunk, default_lease=False):
+    deals = []
+    for row_num, raw in chunk:
+        if isinstance(raw, ValueError):
+            deals.append({"id": row_num, "error": str(raw)})
+            continue
+        try:
+            deals.append(normalize_deal(raw, row_num, default_lease))
+        except (KeyError, ValueError, IndexError, TypeError) as e:
+            deals.append({"id": raw.get("id", row_num), "error": str(e)})
+    # Taxes for the whole chunk are computed in one vectorized pass; rows that failed to parse are left out. If that
+    # pass fails, each row works out its own taxes so only the offending rows become errors.
+    valid = [entry[0] for entry in deals if not isinstance(entry, dict)]
+    try:
+        taxes = iter(chunk_taxes(valid) if valid else [])
+    except (KeyError, ValueError, IndexError, TypeError):
+        taxes = None
+    rows = []
+    for entry in deals:
+        if isinstance(entry, dict):
+            rows.append(entry)
+            continue
+        deal, grid = entry
+        try:
+            rows.extend(price_deal(deal, grid, None if taxes is None else next(taxes)))
+        except (KeyError, ValueError, IndexError, TypeError) as e:
+            rows.append({"id": deal.deal_id, "error": str(e)})
+    return rows
+
+def _jsonl_records(f):
+    # A bad line becomes a ValueError in place of its record, so price_chunk reports it as an error row.
+    for line_num, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield ValueError(f"line {line_num}: invalid JSON: {e.msg} at column {e.colno}")
+            continue
+        yield record if isinstance(record, dict) else ValueError(f"line {line_num}: expected a JSON object")
+
+def read_deals(f, fmt):
+    if fmt == "jsonl":
+        records = _jsonl_records(f)
+    else:
+        records = csv.DictReader(f)
+    return enumerate(records, start=1)
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def write_rows(f, fmt, row_chunks):
+    count = 0
+    if fmt == "jsonl":
+        for rows in row_chunks:
+            f.writelines(json.dumps(row) + "\n" for row in rows)
+            count += len(rows)
+    else:
+        writer = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS + ["error"], extrasaction="ignore")
+        writer.writeheader()
+        for rows in row_chunks:
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+def run_batch(in_file, out_file, in_fmt, out_fmt, workers=None, chunk_size=1000, default_lease=False):
+    chunks = chunked(read_deals(in_file, in_fmt), chunk_size)
+    price = partial(price_chunk, default_lease=default_lease)
+    if workers == 0:
+        return write_rows(out_file, out_fmt, map(price, chunks))
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return write_rows(out_file, out_fmt, ordered_imap(executor, price, chunks, window=workers * 2))
+
+def detect_format(path, fmt):
+    if fmt:
+        return fmt
+    return "jsonl" if path and path.endswith((".jsonl", ".ndjson")) else "csv"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Price a CSV or JSONL file of deals without the Streamlit UI.")
+    parser.add_argument("input", help="CSV or JSONL file of deals, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file, or - for stdout")
+    parser.add_argument("--input-format", choices=["csv", "jsonl"])
+    parser.add_argument("--output-format", choices=["csv", "jsonl"])
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (0 prices in this process)")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--lease", action="store_true", help="price rows without a lease column as leases")
+    args = parser.parse_args(argv)
+    in_fmt = detect_format(args.input, args.input_format)
+    out_fmt = detect_format(args.output, args.output_format)
+    in_file = sys.stdin if args.input == "-" else open(args.input, newline="")
+    out_file = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    try:
+        count = run_batch(in_file, out_file, in_fmt, out_fmt, args.workers, args.chunk_size, args.lease)
+    finally:
+        if in_file is not sys.stdin:
+            in_file.close()
+        if out_file is not sys.stdout:
+            out_file.close()
+    print(f"Wrote {count} quote rows", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import argparse, json, os, platform, random, subprocess, sys, tempfile, time, tracemalloc
+import numpy as np
+from utils import calculate_monthly_payment, calculate_lease_payment, calculate_taxes, calculate_balance
+from utils import payment_grid, lease_payment_grid
+from documents import generate_pdf, fill_fi_pdf
+
+PRICING_SIZES = (1, 1_000, 1_000_000)
+DEAL_POOL_SIZE = 10_000
+# A percentile from a handful of timings is just the slowest one. Small pricing cases are repeated up to
+# MIN_PRICING_SAMPLES calls, and compare() only checks p99 for results with at least P99_MIN_SAMPLES timings.
+MIN_PRICING_SAMPLES = 1_000
+P99_MIN_SAMPLES = 100
+STATES = ("NC", "SC", "VA", "GA")
+FI_TEXT_FIELDS = 200
+FI_CHECKBOXES = 20
+STARTUP_IMPORTS = {
+    "startup:app_imports": "import utils, render_pool, metrics",
+    "startup:app_imports+documents": "import utils, render_pool, metrics, documents",
+}
+STARTUP_SCRIPT = "import resource, time; t = time.perf_counter(); {stmt}; print(time.perf_counter() - t, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+
+def synthetic_deals(n, seed=0):
+    rng = random.Random(seed)
+    deals = []
+    for _ in range(n):
+        market_value = rng.uniform(15000, 80000)
+        deals.append({
+            "state": rng.choice(STATES),
+            "market_value": market_value,
+            "discount": rng.uniform(0, 3000),
+            "rebate": rng.choice((0, 500, 1000, 2500)),
+            "trade_value": rng.choice((0, 0, rng.uniform(2000, 20000))),
+            "trade_payoff": rng.choice((0, rng.uniform(0, 15000))),
+            "doc_fee": 799.00,
+            "non_tax_fees": 125.00,
+            "down_payment": rng.choice((0, 1000, 2000, 3000, 5000)),
+            "rate": rng.uniform(2.9, 21.9),
+            "money_factor": rng.uniform(0.0015, 0.0035),
+            "term": rng.choice((36, 48, 60, 72, 84)),
+            "residual": rng.uniform(0.45, 0.70),
+        })
+    return deals
+
+def pricing_cases():
+    return {
+        "calculate_monthly_payment": lambda d: calculate_monthly_payment(d["market_value"], d["down_payment"], d["rate"], d["term"]),
+        "calculate_lease_payment": lambda d: calculate_lease_payment(d["market_value"], d["doc_fee"], d["non_tax_fees"], 0, d["down_payment"], d["rebate"], d["money_factor"], d["term"], d["residual"], d["trade_value"], d["trade_payoff"], d["discount"]),
+        "calculate_taxes": lambda d: calculate_taxes(d["state"], d["market_value"], d["discount"], d["doc_fee"], d["trade_value"]),
+        "calculate_balance": lambda d: calculate_balance(d["market_value"], d["discount"], d["rebate"], d["trade_value"], d["trade_payoff"], 900.0, d["doc_fee"], d["non_tax_fees"]),
+        "payment_grid": lambda d: payment_grid(d["market_value"], (1000, 2000, 3000), (d["rate"],) * 3, (36, 60, 72)),
+        "lease_payment_grid": lambda d: lease_payment_grid(d["market_value"], d["doc_fee"], d["non_tax_fees"], 0, (1000, 2000, 3000), d["rebate"], (d["money_factor"],) * 3, (36, 39, 48), (d["residual"],) * 3, d["trade_value"], d["trade_payoff"], d["discount"]),
+    }
+
+def synthetic_quote_data(deal, index=0):
+    terms = (36, 60, 72)
+    downs = (1000.0, 2000.0, 3000.0)
+    payments = payment_grid(deal["market_value"], downs, (deal["rate"],) * 3, terms).round(2).tolist()
+    return {
+        "date": "01/01/2026", "salesperson": "Bench Sales", "manager": "Bench Manager",
+        "buyer": f"Customer {index}", "address": "1 Main St", "city": "Concord", "state": deal["state"], "zip": "28027",
+        "email_add": "bench@example.com", "cell_phone": "555-555-0100",
+        "year": "2025", "make": "NISSAN", "model": "ROGUE", "trim": "SV", "stock_no": f"N{index:05d}",
+        "vin": "JN8BT3BB0SW000000", "miles": "12",
+        "trade_vin": "1N4BL4BV5KC000000" if deal["trade_value"] else "", "trade_year": "2019", "trade_make": "NISSAN",
+        "trade_model": "ALTIMA", "trade_miles": "48000",
+        "sale_price": deal["market_value"], "discount": deal["discount"], "rebate": deal["rebate"], "doc_fee": deal["doc_fee"],
+        "sales_tax": 900.0, "non_tax_fees": deal["non_tax_fees"], "balance": deal["market_value"] - deal["discount"],
+        "trade_value": deal["trade_value"], "trade_payoff": deal["trade_payoff"],
+        "quotes": {term: dict(zip(downs, row)) for term, row in zip(terms, payments)},
+    }
+
+def synthetic_fi_fields():
+    text_fields = [f"bench_text_{i}" for i in range(FI_TEXT_FIELDS)]
+    checkboxes = [f"bench_cb_{i}" for i in range(FI_CHECKBOXES)]
+    return text_fields, checkboxes
+
+def write_fi_template(path):
+    from reportlab.pdfgen import canvas
+    text_fields, checkboxes = synthetic_fi_fields()
+    c = canvas.Canvas(path)
+    y = 760
+    for name in text_fields + checkboxes:
+        if name in checkboxes:
+            c.acroForm.checkbox(name=name, x=40, y=y, size=10)
+        else:
+            c.acroForm.textfield(name=name, x=40, y=y, width=240, height=12, fontSize=8)
+        y -= 14
+        if y < 40:
+            c.showPage()
+            y = 760
+    c.showPage()
+    c.save()
+    return path
+
+def synthetic_fi_data(index=0):
+    text_fields, checkboxes = synthetic_fi_fields()
+    data = {name: f"value {index} {i}" for i, name in enumerate(text_fields)}
+    data.update({name: bool((index + i) % 2) for i, name in enumerate(checkboxes)})
+    return data
+
+def measure(fn, items, n=None):
+    # Large runs cycle through a fixed pool of inputs so the benchmark itself does not need millions of dicts.
+    n = n or len(items)
+    pool_size = len(items)
+    fn(items[0])
+    latencies = np.empty(n)
+    perf_counter = time.perf_counter
+    start = perf_counter()
+    for i in range(n):
+        item = items[i % pool_size]
+        t0 = perf_counter()
+        fn(item)
+        latencies[i] = perf_counter() - t0
+    elapsed = perf_counter() - start
+    tracemalloc.start()
+    for item in items:
+        fn(item)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "n": n,
+        "seconds": elapsed,
+        "ops_per_sec": n / elapsed if elapsed else float("inf"),
+        "p50_us": float(np.percentile(latencies, 50) * 1e6),
+        "p99_us": float(np.percentile(latencies, 99) * 1e6),
+        "peak_kib": peak / 1024,
+    }
+
+def bench_pricing(sizes):
+    results = {}
+    deals = synthetic_deals(min(max(sizes), DEAL_POOL_SIZE))
+    for name, fn in pricing_cases().items():
+        for n in sizes:
+            results[f"{name}[{n}]"] = measure(fn, deals[:n], max(n, MIN_PRICING_SAMPLES))
+    return results
+
+def bench_documents(iterations):
+    results = {}
+    deals = synthetic_deals(iterations, seed=1)
+    quotes = [synthetic_quote_data(deal, i) for i, deal in enumerate(deals)]
+    results[f"generate_pdf[{iterations}]"] = measure(lambda data: generate_pdf(data, filename=None), quotes)
+    with tempfile.TemporaryDirectory() as tmp:
+        template = write_fi_template(os.path.join(tmp, "FIDocsBench.pdf"))
+        fill_fi_pdf(template, None, {})
+        fi_data = [synthetic_fi_data(i) for i in range(iterations)]
+        results[f"fill_fi_pdf[{iterations}]"] = measure(lambda data: fill_fi_pdf(template, None, data), fi_data)
+    return results
+
+def bench_startup(runs):
+    # Each run is a fresh interpreter, which is what a pod restart pays before the first page render.
+    results = {}
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name, stmt in STARTUP_IMPORTS.items():
+        latencies = []
+        peak_kib = 0
+        for _ in range(runs):
+            out = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT.format(stmt=stmt)], cwd=here, capture_output=True, text=True, check=True)
+            seconds, maxrss = out.stdout.split()
+            latencies.append(float(seconds))
+            peak_kib = max(peak_kib, int(maxrss))
+        latencies = np.array(latencies)
+        results[name] = {
+            "n": runs,
+            "seconds": float(latencies.sum()),
+            "ops_per_sec": runs / latencies.sum(),
+            "p50_us": float(np.percentile(latencies, 50) * 1e6),
+            "p99_us": float(np.percentile(latencies, 99) * 1e6),
+            "peak_kib": peak_kib,
+        }
+    return results
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        if current["ops_per_sec"] < previous["ops_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['ops_per_sec']:.0f}/s vs baseline {previous['ops_per_sec']:.0f}/s")
+        if min(current["n"], previous["n"]) >= P99_MIN_SAMPLES and current["p99_us"] > previous["p99_us"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {current['p99_us']:.1f}us vs baseline {previous['p99_us']:.1f}us")
+    return regressions
+
+def print_results(results):
+    print(f"{'benchmark':<36} {'ops/s':>14} {'p50 us':>10} {'p99 us':>10} {'peak KiB':>10}")
+    for name, r in results.items():
+        print(f"{name:<36} {r['ops_per_sec']:>14,.0f} {r['p50_us']:>10.1f} {r['p99_us']:>10.1f} {r['peak_kib']:>10.1f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pricing and document paths in utils.py.")
+    parser.add_argument("--only", choices=["pricing", "documents", "startup"])
+    parser.add_argument("--quick", action="store_true", help="skip the 1M-deal pricing runs")
+    parser.add_argument("--doc-iterations", type=int, default=50)
+    parser.add_argument("--startup-runs", type=int, default=10)
+    parser.add_argument("--save-baseline", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved baseline and exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed fractional slowdown before a regression is reported")
+    args = parser.parse_args(argv)
+    results = {}
+    if args.only in (None, "pricing"):
+        sizes = [n for n in PRICING_SIZES if not (args.quick and n > 1_000)]
+        results.update(bench_pricing(sizes))
+    if args.only in (None, "documents"):
+        results.update(bench_documents(args.doc_iterations))
+    if args.only in (None, "startup"):
+        results.update(bench_startup(args.startup_runs))
+    print_results(results)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "results": results}, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
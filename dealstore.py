@@ -0,0 +1,225 @@
+import json, os, re, sqlite3, threading, time
+from collections import namedtuple
+from functools import lru_cache
+
+DEAL_STORE_PATH = os.environ.get("QUOTE_DEAL_STORE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "deals.db"))
+
+# Session keys under a tab's prefix that are not restored: buttons cannot be set through session state, the trade
+# totals, taxes and balance are recomputed from the other inputs, and deal_id belongs to the store itself.
+SNAPSHOT_SKIP = {
+    "trade_value", "trade_acv", "trade_payoff", "taxes", "balance", "trade_totals", "deal_id",
+    "submit_modal", "submit_button", "download_button", "save_deal",
+}
+SNAPSHOT_SKIP_PREFIXES = ("store_",)
+
+DealSummary = namedtuple("DealSummary", "id kind customer phone email vin stocknum updated_at")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deals (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    customer TEXT NOT NULL DEFAULT '',
+    phone TEXT NOT NULL DEFAULT '',
+    vin TEXT NOT NULL DEFAULT '',
+    stocknum TEXT NOT NULL DEFAULT '',
+    updated_at REAL NOT NULL,
+    snapshot TEXT NOT NULL,
+    email TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS deals_customer ON deals (customer COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS deals_phone ON deals (phone);
+CREATE INDEX IF NOT EXISTS deals_vin ON deals (vin);
+CREATE INDEX IF NOT EXISTS deals_stocknum ON deals (stocknum COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS deals_updated_at ON deals (updated_at);
+"""
+# Full-text index over the customer fields. It is contentless and kept in step by triggers, so a save updates it in
+# the same transaction. Phones are indexed whole and by their last 7 and 4 digits, which is how people quote them.
+_SEARCH_SCHEMA = """
+CREATE INDEX IF NOT EXISTS deals_email ON deals (email);
+CREATE VIRTUAL TABLE IF NOT EXISTS deal_search USING fts5 (customer, phone, email, content='', prefix='2 3', tokenize='unicode61 remove_diacritics 2');
+CREATE TABLE IF NOT EXISTS deal_terms (term TEXT PRIMARY KEY) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS deals_search_insert AFTER INSERT ON deals BEGIN
+    INSERT INTO deal_search (rowid, customer, phone, email) VALUES (new.id, new.customer, {new_phone}, new.email);
+END;
+CREATE TRIGGER IF NOT EXISTS deals_search_delete AFTER DELETE ON deals BEGIN
+    INSERT INTO deal_search (deal_search, rowid, customer, phone, email) VALUES ('delete', old.id, old.customer, {old_phone}, old.email);
+END;
+CREATE TRIGGER IF NOT EXISTS deals_search_update AFTER UPDATE OF customer, phone, email ON deals BEGIN
+    INSERT INTO deal_search (deal_search, rowid, customer, phone, email) VALUES ('delete', old.id, old.customer, {old_phone}, old.email);
+    INSERT INTO deal_search (rowid, customer, phone, email) VALUES (new.id, new.customer, {new_phone}, new.email);
+END;
+"""
+_PHONE_TERMS = "{row}.phone || ' ' || substr({row}.phone, -7) || ' ' || substr({row}.phone, -4)"
+_SUMMARY_COLUMNS = "deals.id, deals.kind, deals.customer, deals.phone, deals.email, deals.vin, deals.stocknum, deals.updated_at"
+_PHONE_QUERY = re.compile(r"[\d\s().+-]+")
+
+def phone_digits(phone):
+    return re.sub(r"\D", "", phone or "")
+
+def _search_terms(text):
+    # Phone-looking input is searched as one run of digits; anything else by its words, e.g. an email's parts.
+    if _PHONE_QUERY.fullmatch(text):
+        return [phone_digits(text)]
+    return re.findall(r"\w+", text.lower())
+
+def _prefix_distance(term, candidate, max_edits):
+    # Edit distance from term to the closest prefix of candidate, counting a swap of neighbours as one edit. Only the
+    # diagonal band max_edits wide can stay within max_edits, so nothing outside it is computed, and the scan gives
+    # up with max_edits + 1 once a whole row is over.
+    over = max_edits + 1
+    width = len(candidate) + 1
+    before, previous = None, [j if j <= max_edits else over for j in range(width)]
+    for i in range(1, len(term) + 1):
+        current = [over] * width
+        if i <= max_edits:
+            current[0] = i
+        for j in range(max(1, i - max_edits), min(width - 1, i + max_edits) + 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (term[i - 1] != candidate[j - 1]))
+            if before and j > 1 and term[i - 1] == candidate[j - 2] and term[i - 2] == candidate[j - 1]:
+                value = min(value, before[j - 2] + 1)
+            current[j] = min(value, over)
+        if min(current) > max_edits:
+            return over
+        before, previous = previous, current
+    return min(previous)
+
+def snapshot_state(state, prefix):
+    start = f"{prefix}_"
+    snapshot = {}
+    for key, value in state.items():
+        if not key.startswith(start):
+            continue
+        name = key[len(start):]
+        if name in SNAPSHOT_SKIP or name.startswith(SNAPSHOT_SKIP_PREFIXES):
+            continue
+        if value is None or isinstance(value, (str, int, float, bool)):
+            snapshot[name] = value
+    return snapshot
+
+def restore_state(state, prefix, snapshot):
+    # Inputs the saved deal did not have are cleared so they fall back to their defaults instead of keeping the
+    # values of whatever deal was open before.
+    for name in snapshot_state(state, prefix).keys() - snapshot.keys():
+        del state[f"{prefix}_{name}"]
+    for name, value in snapshot.items():
+        state[f"{prefix}_{name}"] = value
+
+class DealStore:
+    def __init__(self, path=DEAL_STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # One connection per store, shared by the session threads under a lock; WAL lets other processes keep
+        # reading and writing the same file while a save is in progress.
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            if "email" not in {row[1] for row in self._conn.execute("PRAGMA table_info(deals)")}:
+                self._conn.execute("ALTER TABLE deals ADD COLUMN email TEXT NOT NULL DEFAULT ''")
+            indexed = self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'deal_search'").fetchone()
+            self._conn.executescript(_SEARCH_SCHEMA.format(new_phone=_PHONE_TERMS.format(row="new"), old_phone=_PHONE_TERMS.format(row="old")))
+            if not indexed:
+                self._conn.execute(f"INSERT INTO deal_search (rowid, customer, phone, email) SELECT id, customer, {_PHONE_TERMS.format(row='deals')}, email FROM deals")
+                for customer, email in self._conn.execute("SELECT customer, email FROM deals").fetchall():
+                    self._add_terms(customer, email)
+
+    def _add_terms(self, *fields):
+        # Name and email words seen so far, for fuzzy matching. fts5vocab would have to total every posting list to
+        # list them, so the store keeps its own; words from deleted deals only cost a wasted candidate. Words with
+        # digits in them (jsmith87) are left out: they still match by prefix, and would swamp the near-miss lists.
+        terms = {term for field in fields for term in re.findall(r"\w+", field.lower()) if len(term) >= 3 and term.isalpha()}
+        self._conn.executemany("INSERT OR IGNORE INTO deal_terms (term) VALUES (?)", [(term,) for term in terms])
+
+    def save(self, deal, snapshot, deal_id=None):
+        row = ("lease" if deal.lease else "finance", deal.customer.strip(), phone_digits(deal.phone), deal.email.strip().lower(), deal.vin.strip().upper(), deal.stocknum.strip(), time.time(), json.dumps(snapshot))
+        with self._lock:
+            self._add_terms(row[1], row[3])
+            if deal_id is not None:
+                cursor = self._conn.execute("UPDATE deals SET kind=?, customer=?, phone=?, email=?, vin=?, stocknum=?, updated_at=?, snapshot=? WHERE id=?", row + (deal_id,))
+                if cursor.rowcount:
+                    return deal_id
+            return self._conn.execute("INSERT INTO deals (kind, customer, phone, email, vin, stocknum, updated_at, snapshot) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row).lastrowid
+
+    def load(self, deal_id):
+        with self._lock:
+            row = self._conn.execute("SELECT snapshot FROM deals WHERE id=?", (deal_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, deal_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM deals WHERE id=?", (deal_id,))
+
+    def recent(self, limit=20):
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {_SUMMARY_COLUMNS} FROM deals ORDER BY updated_at DESC LIMIT ?", (limit,)).fetchall()
+        return [DealSummary(*row) for row in rows]
+
+    def find(self, text, limit=20):
+        # Exact VIN and stock number hits come first, then full-text prefix matches on name, phone and email, newest
+        # first. Only when nothing matches are the query words widened to known words within an edit or two.
+        text = (text or "").strip()
+        if not text:
+            return self.recent(limit)
+        exact = f"""
+            SELECT {_SUMMARY_COLUMNS} FROM deals WHERE vin = ?
+            UNION SELECT {_SUMMARY_COLUMNS} FROM deals WHERE stocknum = ? COLLATE NOCASE
+            ORDER BY updated_at DESC LIMIT ?
+        """
+        terms = [term for term in _search_terms(text) if term]
+        with self._lock:
+            rows = self._conn.execute(exact, (text.upper(), text, limit)).fetchall()
+            if terms:
+                rows += self._match(" AND ".join(f'"{term}"*' for term in terms), limit)
+                if not rows:
+                    rows += self._match(" AND ".join(self._fuzzy_term(term) for term in terms), limit)
+        found = {}
+        for row in rows:
+            found.setdefault(row[0], DealSummary(*row))
+        return list(found.values())[:limit]
+
+    def _match(self, query, limit):
+        # Walking the index by descending rowid stops after limit hits; ranking by bm25 would score every match first.
+        sql = f"SELECT {_SUMMARY_COLUMNS} FROM deal_search JOIN deals ON deals.id = deal_search.rowid WHERE deal_search MATCH ? ORDER BY deal_search.rowid DESC LIMIT ?"
+        return self._conn.execute(sql, (query, limit)).fetchall()
+
+    def _fuzzy_term(self, term):
+        # Candidates share the first character, so the vocabulary scan is a range over its primary key; only the
+        # closest ones are kept so a near miss does not drown in every word a couple of edits away.
+        if len(term) < 3 or not term.isalpha():
+            return f'"{term}"*'
+        max_edits = 1 if len(term) <= 4 else 2
+        candidates = self._conn.execute("SELECT term FROM deal_terms WHERE term >= ? AND term < ?", (term[0], chr(ord(term[0]) + 1))).fetchall()
+        # A candidate missing more than max_edits of the term's letters cannot be close, and that set test is far
+        # cheaper than the distance itself.
+        letters = set(term)
+        span = len(term) + max_edits
+        distances = {candidate: _prefix_distance(term, candidate[:span], max_edits) for (candidate,) in candidates if len(letters - set(candidate[:span])) <= max_edits}
+        best = min(distances.values(), default=max_edits + 1)
+        close = [candidate for candidate, distance in distances.items() if distance == best <= max_edits]
+        return "(" + " OR ".join([f'"{term}"*'] + [f'"{candidate}"*' for candidate in close]) + ")"
+
+    def find_duplicates(self, deal, deal_id=None, limit=5):
+        # Earlier deals for what is probably the same customer: same phone, same email or same name.
+        phone = phone_digits(deal.phone)
+        email = deal.email.strip().lower()
+        customer = deal.customer.strip()
+        query = f"""
+            SELECT {_SUMMARY_COLUMNS} FROM deals WHERE phone = ? AND id IS NOT ?
+            UNION SELECT {_SUMMARY_COLUMNS} FROM deals WHERE email = ? AND id IS NOT ?
+            UNION SELECT {_SUMMARY_COLUMNS} FROM deals WHERE customer = ? COLLATE NOCASE AND id IS NOT ?
+            ORDER BY updated_at DESC LIMIT ?
+        """
+        params = (phone if len(phone) >= 7 else None, deal_id, email or None, deal_id, customer or None, deal_id, limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [DealSummary(*row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+@lru_cache(maxsize=None)
+def default_deal_store():
+    return DealStore()
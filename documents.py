@@ -0,0 +1,334 @@
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Spacer, Paragraph, PageBreak
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib import colors
+import logging, pdfrw, threading, os, io, copy, zipfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from utils import ordered_imap
+from amortization import amortization_schedule, schedule_rows
+
+_fi_templates = {}
+_fi_templates_lock = threading.Lock()
+
+def load_fi_template(in_path):
+    key = (in_path, os.stat(in_path).st_mtime_ns)
+    with _fi_templates_lock:
+        template = _fi_templates.get(key)
+        if template is None:
+            pdf = pdfrw.PdfReader(in_path)
+            fields = {}
+            for page in pdf.pages:
+                annotations = page['/Annots']
+                if annotations is None:
+                    continue
+                for annotation in annotations:
+                    if annotation['/Subtype'] == '/Widget' and '/T' in annotation and annotation['/T']:
+                        fields.setdefault(annotation['/T'].to_unicode(), []).append(annotation)
+            pdf.Root.AcroForm.update(
+                pdfrw.PdfDict(NeedAppearances=pdfrw.PdfObject('true')))
+            for stale in [k for k in _fi_templates if k[0] == in_path]:
+                del _fi_templates[stale]
+            template = _fi_templates[key] = (pdf, fields, threading.Lock())
+        return template
+
+def _field_update(value):
+    if isinstance(value, bool):  # Handle checkboxes
+        state = pdfrw.PdfName('Yes') if value else pdfrw.PdfName('Off')
+        return {pdfrw.PdfName.V: state, pdfrw.PdfName.AS: state}
+    if isinstance(value, (float, int)):  # Convert numbers to strings
+        value = str(value)
+    return {pdfrw.PdfName.V: pdfrw.objects.pdfstring.PdfString.encode(value)}
+
+def fill_fi_pdf(in_path, out_path, data):
+    if out_path is None:
+        buffer = io.BytesIO()
+        fill_fi_pdf(in_path, buffer, data)
+        return buffer.getvalue()
+    pdf, fields, lock = load_fi_template(in_path)
+    updates = [(annotation, _field_update(value)) for key, value in data.items() for annotation in fields.get(key, ())]
+    with lock:
+        # The parsed template is shared, so only the touched entries are copied and restored after writing.
+        saved = [(annotation, {name: annotation[name] for name in update}) for annotation, update in updates]
+        try:
+            for annotation, update in updates:
+                annotation.update(update)
+            pdfrw.PdfWriter().write(out_path, pdf)
+        finally:
+            for annotation, previous in reversed(saved):
+                for name, value in previous.items():
+                    annotation[name] = value
+    return out_path
+
+_QUOTE_COMBINED_STYLE = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'TOP')
+])
+_QUOTE_HEADER_RIGHT_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+])
+_QUOTE_DETAILS_STYLE = TableStyle([
+    ('GRID', (0, 0), (-1, -1), 1, colors.white),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.white),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica'),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+])
+_QUOTE_SELECTION_STYLE = TableStyle([
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.black),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER')
+])
+_QUOTE_TRADE_HEADER_STYLES = tuple(TableStyle([
+    ('BACKGROUND', (0, row), (-1, row), colors.black),
+    ('TEXTCOLOR', (0, row), (-1, row), colors.white),
+    ('FONTNAME', (0, row), (-1, row), 'Helvetica-Bold')
+]) for row in (3, 6))
+_QUOTE_BREAKDOWN_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('LINEBELOW', (1, 0), (1, -1), 1, colors.black),
+])
+_QUOTE_GRID_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.black),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-BoldOblique'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica-Oblique'),
+    ('FONTSIZE', (0, 1), (-1, -1), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+_QUOTE_SCHEDULE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.black),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+    ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.grey),
+])
+_QUOTE_HEADER_RIGHT_WIDTHS = (80, 150)
+_QUOTE_HEADER_WIDTHS = (200, 100, 260)
+_QUOTE_DETAILS_WIDTHS = (70, 230, 55, 160)
+_QUOTE_SELECTION_WIDTHS = (55, 65, 100, 80, 135, 80)
+_QUOTE_BREAKDOWN_WIDTHS = (100, 80)
+_QUOTE_COMBINED_WIDTHS = (300, 20, 220)
+_QUOTE_SCHEDULE_WIDTHS = (60, 90, 90, 90, 110)
+
+def _build_quote_static_layout():
+    header_left = Table([["MODERN AUTOMOTIVE"]], colWidths=[200])
+    header_left.setStyle(TableStyle([
+        ('SPAN', (0, 0), (-1, -1)),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 14),
+    ]))
+    disclaimer_line = Table([["* A.P.R Subject to equity and credit requirements."]], colWidths=[470])
+    disclaimer_line.setStyle(TableStyle([
+        ('SPAN', (0, 0), (-1, -1)),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ]))
+    signature_table = Table([
+        ["Customer Approval: ", "_________________________ ", "Management Approval: ", "_________________________"]
+    ], colWidths=[150, 100, 150, 100])
+    signature_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ]))
+    paragraph_text = "By signing this authorization form, you certify that the above personal information is correct and accurate, and authorize the release of credit and employment information. By signing above, I provide to the dealership and its affiliates consent to communicate with me about my vehicle or any future vehicles using electronic, verbal and written communications including but not limited to email, text messaging, SMS, phone calls and direct mail. Terms and Conditions subject to credit approval. For Information Only. This is not an offer or contract for sale."
+    paragraph_style = ParagraphStyle('QuoteDisclaimer', parent=getSampleStyleSheet()["Normal"], fontSize=6)
+    return {
+        'header_left': header_left,
+        'disclaimer_line': disclaimer_line,
+        'signature_table': signature_table,
+        'disclaimer': Paragraph(paragraph_text, paragraph_style),
+    }
+
+# Built once at import. generate_pdf lays out shallow copies, so wrap/draw state never touches these.
+_QUOTE_STATIC_LAYOUT = _build_quote_static_layout()
+
+def _quote_static(name):
+    return copy.copy(_QUOTE_STATIC_LAYOUT[name])
+
+def _quote_elements(data):
+    elements = []
+    header_data_right = [
+        ["Date:", data.get('date', '')],
+        ["Sales Person:", data.get('salesperson', '')],
+        ["Manager:", data.get('manager', '')]
+    ]
+    header_table_right = Table(header_data_right, colWidths=_QUOTE_HEADER_RIGHT_WIDTHS, style=_QUOTE_HEADER_RIGHT_STYLE)
+    spacer = Spacer(width=100, height=0)
+    combined_header_data = [
+        [_quote_static('header_left'), spacer, header_table_right]
+    ]
+    combined_header_table = Table(combined_header_data, colWidths=_QUOTE_HEADER_WIDTHS, style=_QUOTE_COMBINED_STYLE)
+    elements.append(combined_header_table)
+    elements.append(Spacer(1, 8))
+    details_data = [
+        ["Customer", data.get('buyer', ''), "", ""],
+        ["", data.get('address', ''), "", ""],
+        ["", f"{data.get('city', '')}, {data.get('state', '')} {data.get('zip', '')}", "", ""],
+        ["Email", data.get('email_add', ''), "Phone", data.get('cell_phone', '')]
+    ]
+    details_table = Table(details_data, colWidths=_QUOTE_DETAILS_WIDTHS, style=_QUOTE_DETAILS_STYLE)
+    elements.append(details_table)
+    elements.append(Spacer(1, 20))
+    selection_data = [
+        ["VEHICLE", "", "", "", "", ""],
+        ["YEAR", "MAKE", "MODEL", "STOCK NO.", "VIN", "MILES"],
+        [
+            data.get('year', ''),
+            data.get('make', ''),
+            f"{data.get('model', '')} {data.get('trim', '')}".strip(),
+            data.get('stock_no', ''),
+            data.get('vin', ''),
+            data.get('miles', '')
+        ]
+    ]
+    if data.get('trade_vin'):
+        selection_data.append(["TRADE-IN", "", "", "", ""])
+        selection_data.append(["YEAR", "MAKE", "MODEL", "", "VIN", "MILES"])
+        selection_data.append([
+            data.get('trade_year', ''),
+            data.get('trade_make', ''),
+            f"{data.get('trade_model', '')} {data.get('trade_trim', '')}".strip(),
+            "",
+            data.get('trade_vin', ''),
+            data.get('trade_miles', '')
+        ])
+    if data.get('trade_vin_2'):
+        selection_data.append(["TRADE-IN 2", "", "", "", ""])
+        selection_data.append(["YEAR", "MAKE", "MODEL", "", "VIN", "MILES"])
+        selection_data.append([
+            data.get('trade_year_2', ''),
+            data.get('trade_make_2', ''),
+            f"{data.get('trade_model_2', '')} {data.get('trade_trim_2', '')}".strip(),
+            "",
+            data.get('trade_vin_2', ''),
+            data.get('trade_miles_2', '')
+        ])
+    selection_table = Table(selection_data, colWidths=_QUOTE_SELECTION_WIDTHS, style=_QUOTE_SELECTION_STYLE)
+    if data.get('trade_vin'):
+        selection_table.setStyle(_QUOTE_TRADE_HEADER_STYLES[0])
+    if data.get('trade_vin_2'):
+        selection_table.setStyle(_QUOTE_TRADE_HEADER_STYLES[1])
+    elements.append(selection_table)
+    elements.append(Spacer(1, 20))
+    grid_data = [["Term"] + [f"${dp:.2f}" for dp in data['quotes'][list(data['quotes'].keys())[0]].keys()]]
+    for term, payments in data['quotes'].items():
+        row = [term]
+        for dp, payment in payments.items():
+            row.append(f"${payment:.2f}")
+        grid_data.append(row)
+    market_value = data.get('sale_price', 0)
+    savings = data.get('rebate', 0) + data.get('discount', 0)
+    sales_price = market_value - savings
+    breakdown_data = [
+        ["Market Value", f"${market_value:.2f}"] if market_value != 0 else None,
+        ["Savings", f"${savings:.2f}"] if savings != 0 else None,
+        ["Sales Price", f"${sales_price:.2f}"] if market_value != 0 else None,
+        ["Trade Value", f"${data.get('trade_value', 0):.2f}"] if data.get('trade_value', 0) != 0 else None,
+        ["Trade Payoff", f"${data.get('trade_payoff', 0):.2f}"] if data.get('trade_payoff', 0) != 0 else None,
+        ["Doc Fee", f"${data.get('doc_fee', 0):.2f}"] if data.get('doc_fee', 0) != 0 else None,
+        ["Sales Tax", f"${data.get('sales_tax', 0):.2f}"] if data.get('sales_tax', 0) != 0 else None,
+        ["Non Tax Fees", f"${data.get('non_tax_fees', 0):.2f}"] if data.get('non_tax_fees', 0) != 0 else None,
+        ["Balance", f"${data.get('balance', 0):.2f}"] if data.get('balance', 0) != 0 else None,
+    ]
+    breakdown_data = [row for row in breakdown_data if row is not None]
+    breakdown_table = Table(breakdown_data, colWidths=_QUOTE_BREAKDOWN_WIDTHS, style=_QUOTE_BREAKDOWN_STYLE)
+    elements.append(Spacer(1, 30))
+    grid_table = Table(grid_data, colWidths=[75] + [75]*len(data['quotes'][list(data['quotes'].keys())[0]].keys()), style=_QUOTE_GRID_STYLE)
+    combined_data = [
+        [grid_table, spacer, breakdown_table]
+    ]
+    combined_table = Table(combined_data, colWidths=_QUOTE_COMBINED_WIDTHS, rowHeights=None, hAlign='LEFT', style=_QUOTE_COMBINED_STYLE)
+    elements.append(combined_table)
+    elements.append(Spacer(1, 20))
+    elements.append(_quote_static('disclaimer_line'))
+    elements.append(Spacer(1, 20))
+    elements.append(_quote_static('signature_table'))
+    elements.append(_quote_static('disclaimer'))
+    if data.get('schedule'):
+        elements.append(PageBreak())
+        elements.extend(_schedule_elements(data['schedule']))
+    return elements
+
+def _schedule_elements(loan):
+    schedule = amortization_schedule(loan['principal'], loan['rate'], loan['term'])
+    rows = schedule_rows(schedule)
+    cells = np.column_stack((rows[:, 1].astype(int).astype(str), np.char.mod("$%.2f", rows[:, 2:])))
+    total_of_payments = schedule['payment'].sum()
+    summary = f"Amount Financed ${loan['principal']:,.2f} at {loan['rate']:.2f}% for {loan['term']} months. Total of Payments ${total_of_payments:,.2f}, Finance Charge ${total_of_payments - loan['principal']:,.2f}."
+    table = Table([["Payment", "Amount", "Interest", "Principal", "Balance"]] + cells.tolist(), colWidths=_QUOTE_SCHEDULE_WIDTHS, repeatRows=1, style=_QUOTE_SCHEDULE_STYLE)
+    styles = getSampleStyleSheet()
+    return [Paragraph("Amortization Schedule", styles["Heading2"]), Paragraph(summary, styles["Normal"]), Spacer(1, 10), table]
+
+def _quote_doc(out):
+    return SimpleDocTemplate(out, pagesize=letter, topMargin=50, leftMargin=36, rightMargin=36)
+
+def generate_pdf(data, filename='quote.pdf'):
+    if filename is None:
+        buffer = io.BytesIO()
+        return buffer.getvalue() if generate_pdf(data, buffer) is not None else None
+    try:
+        _quote_doc(filename).build(_quote_elements(data))
+        return filename
+    except Exception:
+        logging.exception("Failed to generate PDF")
+        return None
+
+def _merge_quote_pdfs(rendered, out):
+    # Each deal is laid out as its own document with the public build(), so a deal that fails, layout errors
+    # included, is skipped and logged without losing the rest; the pages are then appended in order.
+    writer = pdfrw.PdfWriter()
+    for index, (data, pdf_bytes) in enumerate(rendered):
+        if pdf_bytes is None:
+            logging.error(f"Skipping quote {index} in bulk PDF")
+            continue
+        writer.addpages(pdfrw.PdfReader(fdata=pdf_bytes).pages)
+    writer.write(out)
+
+def _quote_filename(data, index):
+    buyer = ''.join(c for c in str(data.get('buyer', '')) if c.isalnum() or c in ' -_').strip()
+    return f"{index + 1:04d}_{buyer or 'quote'}.pdf"
+
+def generate_pdfs(deals, out, mode='pdf', workers=None, filename_func=_quote_filename):
+    if mode not in ('pdf', 'zip'):
+        raise ValueError(f"Unknown bulk PDF mode: {mode}")
+    if mode == 'pdf':
+        deals = iter(deals)
+        if workers:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                _merge_quote_pdfs(ordered_imap(executor, _render_quote_with_data, deals, window=workers * 2), out)
+        else:
+            _merge_quote_pdfs(map(_render_quote_with_data, deals), out)
+        return out
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        deals = iter(deals)
+        if workers:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                rendered = ordered_imap(executor, _render_quote_with_data, deals, window=workers * 2)
+                _write_quote_archive(archive, rendered, filename_func)
+        else:
+            _write_quote_archive(archive, map(_render_quote_with_data, deals), filename_func)
+    return out
+
+def _render_quote_with_data(data):
+    return data, generate_pdf(data, filename=None)
+
+def _write_quote_archive(archive, rendered, filename_func):
+    for index, (data, pdf_bytes) in enumerate(rendered):
+        if pdf_bytes is not None:
+            archive.writestr(filename_func(data, index), pdf_bytes)
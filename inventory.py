@@ -0,0 +1,296 @@
+import argparse, itertools, json, logging, os, re, shutil, sys, threading, zlib
+import numpy as np
+from collections import namedtuple
+from vindecode import decode_vins
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+INVENTORY_FEED_PATH = os.environ.get("QUOTE_INVENTORY_FEED", os.path.join(DATA_DIR, "inventory.csv"))
+INVENTORY_DIR = os.environ.get("QUOTE_INVENTORY_DIR", os.path.join(DATA_DIR, "inventory"))
+
+Vehicle = namedtuple("Vehicle", "stocknum vin newused year make model trim odometer cost book_value")
+
+# Column -> (kind, export headers it may appear under). Headers are compared lowercased with punctuation removed.
+COLUMNS = {
+    "stocknum": ("str", ("stock", "stocknum", "stocknumber", "stockno")),
+    "vin": ("str", ("vin", "vinnumber")),
+    "newused": ("str", ("newused", "nu", "type", "condition")),
+    "year": ("str", ("year", "modelyear")),
+    "make": ("str", ("make",)),
+    "model": ("str", ("model",)),
+    "trim": ("str", ("trim", "series")),
+    "odometer": ("int", ("odometer", "miles", "mileage")),
+    "cost": ("float", ("cost", "vehiclecost", "invoice")),
+    "book_value": ("float", ("bookvalue", "book")),
+}
+INDEXED_COLUMNS = ("stocknum", "vin")
+NEWUSED = {"N": "New", "NEW": "New", "U": "Used", "USED": "Used", "C": "CPO", "CPO": "CPO", "CERTIFIED": "CPO"}
+# Numbers this process's builds, so rebuilding the same feed never writes into a directory a reader may have mapped.
+_builds = itertools.count()
+
+def _header_key(name):
+    return re.sub(r"[^a-z0-9]", "", str(name).lower())
+
+def _key(value):
+    return str(value or "").strip().upper()
+
+def _hash(key):
+    return zlib.crc32(key.encode())
+
+def read_feed(path):
+    import pandas as pd
+    if path.endswith((".parquet", ".pq")):
+        frame = pd.read_parquet(path)
+    else:
+        frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+    headers = {_header_key(name): name for name in frame.columns}
+    columns = {}
+    for column, (kind, aliases) in COLUMNS.items():
+        source = next((headers[alias] for alias in aliases if alias in headers), None)
+        values = frame[source] if source is not None else pd.Series([""] * len(frame), index=frame.index)
+        if kind == "str":
+            columns[column] = values.fillna("").astype(str).str.strip()
+        else:
+            numbers = pd.to_numeric(values.astype(str).str.replace(r"[$,\s]", "", regex=True), errors="coerce").fillna(0)
+            columns[column] = numbers.round().astype(np.int64) if kind == "int" else numbers.astype(float)
+    columns["stocknum"] = columns["stocknum"].str.upper()
+    columns["vin"] = columns["vin"].str.upper()
+    columns["newused"] = columns["newused"].str.upper().map(NEWUSED).fillna("")
+    # Exports often leave year or make blank on units still in transit; the VIN carries both.
+    decoded = decode_vins(columns["vin"].tolist())
+    usable = decoded["check_digit_ok"]
+    columns["year"] = columns["year"].where((columns["year"] != "") | ~usable | (decoded["year"] == 0), decoded["year"].astype(str))
+    columns["make"] = columns["make"].where((columns["make"] != "") | ~usable | (decoded["make"] == ""), decoded["make"])
+    return columns
+
+# zlib's CRC-32 byte table, so a whole column of keys hashes with one array step per character position.
+_CRC_TABLE = np.arange(256, dtype=np.uint32)
+for _ in range(8):
+    _CRC_TABLE = np.where(_CRC_TABLE & 1, (_CRC_TABLE >> 1) ^ np.uint32(0xEDB88320), _CRC_TABLE >> 1)
+
+def _hashes(keys):
+    # _hash of every key in a bytes array: keys shorter than the column width stop updating once they run out.
+    codes = keys.view(np.uint8).reshape(len(keys), keys.itemsize)
+    lengths = np.char.str_len(keys)
+    crc = np.full(len(keys), 0xFFFFFFFF, dtype=np.uint32)
+    for position in range(keys.itemsize):
+        crc = np.where(position < lengths, _CRC_TABLE[(crc ^ codes[:, position]) & 0xFF] ^ (crc >> 8), crc)
+    return crc ^ np.uint32(0xFFFFFFFF)
+
+def _hash_index(keys):
+    # Open addressing with linear probing over a power-of-two table at most half full. Slots hold row numbers, -1 is
+    # empty; a key repeated in the feed keeps its first row. Keys are placed in rounds: every unplaced key tries its
+    # current slot, one key takes each free slot and the rest move on by one, so every slot between a key's home and
+    # where it lands is filled before any lookup can probe it.
+    size = 1 << max(4, (2 * len(keys) - 1).bit_length())
+    table = np.full(size, -1, dtype=np.int32)
+    mask = size - 1
+    _, rows = np.unique(keys, return_index=True)
+    rows = rows[keys[rows] != b""]
+    slots = (_hashes(keys[rows]) & mask).astype(np.intp)
+    while len(rows):
+        free = np.flatnonzero(table[slots] == -1)
+        _, first = np.unique(slots[free], return_index=True)
+        placed = free[first]
+        table[slots[placed]] = rows[placed]
+        left = np.ones(len(rows), dtype=bool)
+        left[placed] = False
+        rows, slots = rows[left], (slots[left] + 1) & mask
+    return table
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def _read_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, "manifest.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _column_arrays(columns):
+    arrays = {}
+    for column, values in columns.items():
+        if COLUMNS[column][0] == "str":
+            encoded = [value.encode() for value in values.tolist()]
+            arrays[column] = np.array(encoded, dtype=f"S{max([len(value) for value in encoded] + [1])}")
+        else:
+            arrays[column] = values.to_numpy()
+    return arrays
+
+def _row_keys(arrays):
+    # Rows are matched between builds by stock number, or by VIN for units without one.
+    stock, vin = arrays["stocknum"], arrays["vin"]
+    return np.where(stock != b"", stock, np.where(vin != b"", np.char.add(b"VIN ", vin), b""))
+
+def _align(keys, previous_keys):
+    # The previous build's row for each new row (-1 for none), and an order for the new rows that keeps matched rows
+    # where the previous build had them and appends the rest, so unchanged columns come out identical.
+    import pandas as pd
+    known = (previous_keys != b"") & ~pd.Index(previous_keys).duplicated()
+    found = pd.Index(previous_keys[known]).get_indexer(keys)
+    positions = np.where(found >= 0, np.flatnonzero(known)[found], -1)
+    positions[(keys == b"") | pd.Index(keys).duplicated()] = -1
+    order = np.argsort(np.where(positions >= 0, positions, len(previous_keys) + np.arange(len(keys))), kind="stable")
+    return order, positions[order]
+
+def _load_previous(out_dir):
+    try:
+        return Inventory.load(out_dir)
+    except (OSError, ValueError, KeyError):
+        return None
+
+def _link(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+def build_inventory(feed_path=INVENTORY_FEED_PATH, out_dir=INVENTORY_DIR):
+    # Each build goes to its own directory and the manifest is swapped in last, so readers in other processes
+    # always map a complete set of columns, old or new. The feed is diffed against the previous build by stock
+    # number or VIN: columns and hash tables that come out the same are hard-linked from it rather than rewritten.
+    signature = _source_signature(feed_path)
+    arrays = _column_arrays(read_feed(feed_path))
+    rows = len(arrays["stocknum"])
+    previous = _load_previous(out_dir)
+    changes = {"added": rows, "removed": 0, "changed": 0}
+    reused = set()
+    if previous is not None:
+        order, positions = _align(_row_keys(arrays), _row_keys(previous.columns))
+        arrays = {column: array[order] for column, array in arrays.items()}
+        matched = np.flatnonzero(positions >= 0)
+        changed = np.zeros(len(matched), dtype=bool)
+        for column, array in arrays.items():
+            old = previous.columns.get(column)
+            if old is None or old.dtype.kind != array.dtype.kind:
+                continue
+            changed |= array[matched] != old[positions[matched]]
+            if len(old) == rows and np.array_equal(old, array):
+                reused.add(column)
+        changes = {"added": rows - len(matched), "removed": len(previous) - len(matched), "changed": int(changed.sum())}
+    version = f"v{signature[0]}-{signature[1]}-{os.getpid()}-{next(_builds)}"
+    version_dir = os.path.join(out_dir, version)
+    os.makedirs(version_dir, exist_ok=True)
+    dtypes = {}
+    for column, array in arrays.items():
+        path = os.path.join(version_dir, f"{column}.npy")
+        if column in reused:
+            _link(os.path.join(previous.path, f"{column}.npy"), path)
+            dtypes[column] = previous.columns[column].dtype.str
+        else:
+            np.save(path, array)
+            dtypes[column] = array.dtype.str
+    for column in INDEXED_COLUMNS:
+        path = os.path.join(version_dir, f"{column}.index.npy")
+        if column in reused:
+            _link(os.path.join(previous.path, f"{column}.index.npy"), path)
+        else:
+            np.save(path, _hash_index(arrays[column]))
+    manifest = {"version": version, "source": signature, "rows": rows, "columns": dtypes, "changes": changes}
+    tmp_path = os.path.join(out_dir, f"manifest.json.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(out_dir, "manifest.json"))
+    # The build this one replaces stays until the next swap, for readers that read the old manifest and have not
+    # mapped its files yet. Older builds go; a build of this same feed may still be in progress in another process.
+    keep = {version, None if previous is None else os.path.basename(previous.path)}
+    current = f"v{signature[0]}-{signature[1]}-"
+    for name in os.listdir(out_dir):
+        if name.startswith("v") and name not in keep and not name.startswith(current):
+            shutil.rmtree(os.path.join(out_dir, name), ignore_errors=True)
+    return manifest
+
+class Inventory:
+    def __init__(self, columns, indexes, source=None, path=None):
+        self.columns = columns
+        self.indexes = indexes
+        self.source = source
+        self.path = path
+
+    @classmethod
+    def load(cls, out_dir=INVENTORY_DIR):
+        # Columns and hash tables are memory-mapped read-only, so every worker process shares one page-cache copy.
+        manifest = _read_manifest(out_dir)
+        if manifest is None:
+            return None
+        version_dir = os.path.join(out_dir, manifest["version"])
+        columns = {column: np.load(os.path.join(version_dir, f"{column}.npy"), mmap_mode="r") for column in manifest["columns"]}
+        indexes = {column: np.load(os.path.join(version_dir, f"{column}.index.npy"), mmap_mode="r") for column in INDEXED_COLUMNS}
+        return cls(columns, indexes, manifest["source"], version_dir)
+
+    def __len__(self):
+        return len(self.columns["stocknum"])
+
+    def _find(self, column, key):
+        table = self.indexes[column]
+        values = self.columns[column]
+        mask = len(table) - 1
+        encoded = key.encode()
+        slot = _hash(key) & mask
+        while True:
+            row = int(table[slot])
+            if row == -1:
+                return None
+            if values[row] == encoded:
+                return row
+            slot = (slot + 1) & mask
+
+    def vehicle(self, row):
+        values = {column: self.columns[column][row] for column in COLUMNS}
+        return Vehicle(**{column: value.decode() if isinstance(value, bytes) else value.item() for column, value in values.items()})
+
+    def by_stock(self, stocknum):
+        key = _key(stocknum)
+        row = self._find("stocknum", key) if key else None
+        return None if row is None else self.vehicle(row)
+
+    def by_vin(self, vin):
+        key = _key(vin)
+        row = self._find("vin", key) if key else None
+        return None if row is None else self.vehicle(row)
+
+    def lookup(self, value):
+        return self.by_stock(value) or self.by_vin(value)
+
+_current = None
+_current_lock = threading.Lock()
+_failed_source = None
+
+def default_inventory():
+    # None when there is no feed. The feed is only re-read when its mtime or size changes, and then by whichever
+    # process notices first; the rest just map the new build.
+    global _current, _failed_source
+    try:
+        signature = _source_signature(INVENTORY_FEED_PATH)
+    except FileNotFoundError:
+        return None
+    current = _current
+    if current is not None and current.source == signature or _failed_source == signature:
+        return current
+    with _current_lock:
+        if (_current is None or _current.source != signature) and _failed_source != signature:
+            manifest = _read_manifest(INVENTORY_DIR)
+            if manifest is None or manifest["source"] != signature:
+                try:
+                    build_inventory()
+                except Exception:
+                    # A feed that will not import leaves the last good build in service, and is not retried until
+                    # the file changes again.
+                    logging.exception("Failed to import inventory feed %s", INVENTORY_FEED_PATH)
+                    _failed_source = signature
+            if _current is None or _failed_source != signature:
+                _current = Inventory.load()
+        return _current
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the memory-mapped inventory index from a CSV or Parquet export.")
+    parser.add_argument("feed", nargs="?", default=INVENTORY_FEED_PATH, help="inventory export (.csv or .parquet)")
+    parser.add_argument("-o", "--output", default=INVENTORY_DIR, help="directory for the column and index files")
+    args = parser.parse_args(argv)
+    manifest = build_inventory(args.feed, args.output)
+    changes = manifest["changes"]
+    print(f"Indexed {manifest['rows']} vehicles into {args.output} ({changes['added']} added, {changes['removed']} removed, {changes['changed']} changed)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
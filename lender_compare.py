@@ -0,0 +1,89 @@
+import numpy as np
+from itertools import repeat
+from money import to_cents, from_cents, round_half_up, payment_cents
+from utils import lease_payments
+
+RANKINGS = ("payment", "total_cost", "reserve")
+CHUNK_PROGRAMS = 5000
+
+def _segment_starts(lenders):
+    return np.flatnonzero(np.r_[True, lenders[1:] != lenders[:-1]]) if len(lenders) else np.zeros(0, dtype=np.int64)
+
+def price_programs(table, deal, balance, terms, down_payments, year=None):
+    # table holds one product/tier/mileage slice of RateSheet.table, so each lender's programs are contiguous and in
+    # lookup order. For every lender, term and down payment the first program covering the term, the LTV against
+    # book_value and the model year is picked in one masked reduction, then the whole lot is priced at once.
+    terms = np.asarray(terms, dtype=float)
+    down_payments = np.asarray(down_payments, dtype=float)
+    ltv = (balance - down_payments) / deal.book_value * 100 if deal.book_value else np.zeros_like(down_payments)
+    rows = len(table["lender"])
+    if not rows:
+        chosen = np.zeros((0, len(terms), len(down_payments)), dtype=np.int64)
+        starts = ends = np.zeros(0, dtype=np.int64)
+    else:
+        eligible = (table["max_term"][:, None, None] >= terms[None, :, None]) & (table["max_ltv"][:, None, None] >= ltv[None, None, :])
+        if year is not None:
+            eligible &= ((table["min_year"] <= year) & (year <= table["max_year"]))[:, None, None]
+        starts = _segment_starts(table["lender"])
+        ends = np.r_[starts[1:], rows]
+        chosen = np.minimum.reduceat(np.where(eligible, np.arange(rows)[:, None, None], rows), starts, axis=0)
+    found = chosen < ends[:, None, None]
+    _, term_index, down_index = np.nonzero(found)
+    program = chosen[found]
+    term = terms[term_index]
+    down_payment = down_payments[down_index]
+    rate = table["rate"][program]
+    markup = table["markup"][program]
+    if deal.lease:
+        residual = table["residual"][program]
+        lease_terms = (deal.market_value, deal.doc_fee, deal.non_tax_fees, 0, down_payment, 0)
+        trade_terms = (deal.trade_value, deal.trade_payoff, deal.discount)
+        payment = lease_payments(*lease_terms, rate, term, residual, *trade_terms)
+        marked_up = lease_payments(*lease_terms, rate + markup, term, residual, *trade_terms)
+    else:
+        financed = to_cents(balance) - to_cents(down_payment)
+        payment = from_cents(payment_cents(financed, rate, term))
+        marked_up = from_cents(payment_cents(financed, rate + markup, term))
+    offers = {
+        "lender": table["lender"][program],
+        "term": term.astype(int),
+        "down_payment": down_payment,
+        "rate": rate,
+        "ltv": np.round(ltv[down_index], 2),
+        "payment": payment,
+        "total_cost": from_cents(to_cents(down_payment) + to_cents(payment) * term.astype(np.int64)),
+        "reserve": from_cents(round_half_up((to_cents(marked_up) - to_cents(payment)) * term * table["reserve_share"][program])),
+    }
+    if deal.lease:
+        offers["residual"] = residual
+    return offers
+
+def rank_offers(offers, rank_by="payment"):
+    # Lowest payment or total cost first, or highest reserve first; ties go to the lower payment.
+    key = -offers["reserve"] if rank_by == "reserve" else offers[rank_by]
+    order = np.lexsort((offers["payment"], key))
+    return {field: column[order] for field, column in offers.items()}
+
+def _chunks(table, chunk_programs):
+    # Whole lenders per chunk, so each worker still sees every program a lender has.
+    starts = _segment_starts(table["lender"]).tolist() + [len(table["lender"])]
+    begin = 0
+    for start in starts[1:]:
+        if start - begin >= chunk_programs or start == starts[-1]:
+            yield {field: column[begin:start] for field, column in table.items()}
+            begin = start
+
+def compare_offers(sheet, deal, balance, terms, down_payments, tier, miles=0, rank_by="payment", executor=None, chunk_programs=CHUNK_PROGRAMS):
+    # Every lender in the sheet priced at every term and down payment, ranked. An executor splits large sheets into
+    # lender chunks; a dealer-sized sheet is quicker in one pass than the cost of shipping it to workers.
+    table = sheet.table
+    selected = (table["product"] == ("lease" if deal.lease else "finance")) & (table["tier"] == tier) & (table["miles"] == (miles if deal.lease else 0))
+    table = {field: column[selected] for field, column in table.items()}
+    year = int(deal.year) if str(deal.year).isdigit() else None
+    if executor is None or len(table["lender"]) <= chunk_programs:
+        offers = price_programs(table, deal, balance, terms, down_payments, year)
+    else:
+        chunks = list(_chunks(table, chunk_programs))
+        parts = list(executor.map(price_programs, chunks, repeat(deal), repeat(balance), repeat(terms), repeat(down_payments), repeat(year)))
+        offers = {field: np.concatenate([part[field] for part in parts]) for field in parts[0]}
+    return rank_offers(offers, rank_by)
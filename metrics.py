@@ -0,0 +1,126 @@
+import os, threading, time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENABLED = os.environ.get("QUOTE_METRICS", "").lower() in ("1", "true", "yes", "on")
+METRICS_FILE = os.environ.get("QUOTE_METRICS_FILE")
+METRICS_PORT = os.environ.get("QUOTE_METRICS_PORT")
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_gauge_sources = {}
+_server = None
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    __slots__ = ("phase", "start")
+
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.phase, time.perf_counter() - self.start)
+        return False
+
+def timer(phase):
+    return _Timer(phase) if ENABLED else _NULL_TIMER
+
+def observe(phase, seconds):
+    with _lock:
+        histogram = _histograms.get(phase)
+        if histogram is None:
+            histogram = _histograms[phase] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        histogram[0][bisect_left(BUCKETS, seconds)] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+def increment(event, amount=1):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[event] = _counters.get(event, 0) + amount
+
+def register_gauges(name, source):
+    _gauge_sources[name] = source
+
+def prometheus_text():
+    with _lock:
+        histograms = {phase: (list(h[0]), h[1], h[2]) for phase, h in _histograms.items()}
+        counters = dict(_counters)
+    lines = [
+        "# HELP quote_phase_seconds Wall time spent in each render/document phase.",
+        "# TYPE quote_phase_seconds histogram",
+    ]
+    for phase, (counts, total, count) in sorted(histograms.items()):
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, counts):
+            cumulative += bucket_count
+            lines.append(f'quote_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+        lines.append(f'quote_phase_seconds_bucket{{phase="{phase}",le="+Inf"}} {count}')
+        lines.append(f'quote_phase_seconds_sum{{phase="{phase}"}} {total}')
+        lines.append(f'quote_phase_seconds_count{{phase="{phase}"}} {count}')
+    lines.append("# HELP quote_events_total Counted events such as PDF failures.")
+    lines.append("# TYPE quote_events_total counter")
+    for event, value in sorted(counters.items()):
+        lines.append(f'quote_events_total{{event="{event}"}} {value}')
+    for name, source in sorted(_gauge_sources.items()):
+        lines.append(f"# TYPE quote_{name} gauge")
+        for key, value in sorted(source().items()):
+            lines.append(f'quote_{name}{{key="{key}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path=None):
+    path = path or METRICS_FILE
+    if not ENABLED or not path:
+        return
+    # Sessions are threads of one process, so the temp name carries the thread as well as the pid. A failed write is
+    # counted and dropped; metrics must never take a page down.
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            f.write(prometheus_text())
+        os.replace(tmp_path, path)
+    except OSError:
+        increment("metrics_write_failure")
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_http_server(port=None, addr="127.0.0.1"):
+    global _server
+    port = port or METRICS_PORT
+    if not ENABLED or not port:
+        return None
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((addr, int(port)), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="quote-metrics", daemon=True).start()
+    return _server
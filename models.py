@@ -0,0 +1,298 @@
+import numpy as np
+from dataclasses import dataclass
+from datetime import datetime
+from operator import attrgetter
+from amortization import loan_totals
+from money import to_cents, from_cents, format_cents
+from utils import dealer_names, modify_stocknum
+
+@dataclass(slots=True)
+class TradeIn:
+    year: str = ""
+    make: str = ""
+    model: str = ""
+    vin: str = ""
+    miles: str = ""
+    value: float = 0.0
+    payoff: float = 0.0
+    acv: float = 0.0
+
+NO_TRADE = TradeIn()
+
+@dataclass(slots=True)
+class Deal:
+    customer: str = ""
+    address: str = ""
+    city: str = ""
+    state: str = ""
+    zipcode: str = ""
+    county: str = ""
+    email: str = ""
+    phone: str = ""
+    stocknum: str = ""
+    vin: str = ""
+    newused: str = "New"
+    year: str = ""
+    make: str = ""
+    model: str = ""
+    trim: str = ""
+    odometer: str = ""
+    veh_cost: float = 0.0
+    book_value: float = 0.0
+    dealer: str = ""
+    consultant: str = ""
+    manager: str = ""
+    market_value: float = 0.0
+    discount: float = 0.0
+    rebate: float = 0.0
+    doc_fee: float = 799.00
+    non_tax_fees: float = 125.00
+    taxes: float = 0.0
+    trades: tuple = ()
+    lease: bool = False
+    deal_id: object = None
+    # Title, lien and insurance details, only needed for the F&I packet.
+    bodystyle: str = ""
+    fuel_type: str = ""
+    drivers_license: str = ""
+    platenum: str = ""
+    plate_exp: str = ""
+    lienholder: str = ""
+    lienholder_address: str = ""
+    lienholder_city: str = ""
+    lienholder_state: str = ""
+    lienholder_zip: str = ""
+    ins_company: str = ""
+    policy: str = ""
+
+    @property
+    def trade_value(self):
+        return sum(trade.value for trade in self.trades)
+
+    @property
+    def trade_payoff(self):
+        return sum(trade.payoff for trade in self.trades)
+
+    @property
+    def trade_acv(self):
+        return sum(trade.acv for trade in self.trades)
+
+    @property
+    def trade1(self):
+        return self.trades[0] if self.trades else NO_TRADE
+
+    @property
+    def trade2(self):
+        return self.trades[1] if len(self.trades) > 1 else NO_TRADE
+
+    @property
+    def is_new(self):
+        return self.newused == "New"
+
+    @property
+    def is_used(self):
+        return self.newused != "New"
+
+    @property
+    def dealer_street(self):
+        return _dealer_address(self.dealer)[0]
+
+    @property
+    def dealer_city(self):
+        return _dealer_address(self.dealer)[1]
+
+    @property
+    def dealer_state_zip(self):
+        return _dealer_address(self.dealer)[2]
+
+    @property
+    def dealer_state(self):
+        return self.dealer_state_zip.split(' ')[0]
+
+    @property
+    def dealer_zip(self):
+        parts = self.dealer_state_zip.split(' ')
+        return parts[1] if len(parts) > 1 else ""
+
+@dataclass(slots=True)
+class QuoteGrid:
+    terms: list
+    rates: list
+    down_payments: list
+    residuals: list = None
+    payments: np.ndarray = None
+
+    def quotes(self):
+        return {term: dict(zip(self.down_payments, row)) for term, row in zip(self.terms, self.payments.round(2).tolist())}
+
+def _dealer_address(dealer):
+    parts = [part.strip() for part in dealer_names.get(dealer, "").split(',')]
+    return parts + [""] * (3 - len(parts))
+
+# Document fields that are plain Deal attributes (dotted paths reach into the trade-ins), fields that never change, and
+# the handful computed per deal in fi_form_data/quote_form_data. The getters are built once at import.
+_FI_ATTRIBUTES = {
+    "bos_salesperson": "consultant", "bos_buyer": "customer", "box_address": "address", "bos_city": "city", "bos_state": "state",
+    "bos_county": "county", "bos_zip": "zipcode", "bos_res_phone": "phone", "bos_email": "email", "bos_cb_new": "is_new",
+    "bos_cb_used": "is_used", "bos_year": "year", "bos_make": "make", "bos_model": "model", "bos_bodystyle": "bodystyle",
+    "bos_vin1": "vin", "bos_stock1": "stocknum", "bos_miles1": "odometer", "bos_sls_mgr": "manager",
+    "bos_year2": "trade1.year", "bos_make2": "trade1.make", "bos_model2": "trade1.model", "bos_miles2": "trade1.miles", "bos_vin2": "trade1.vin",
+    "bos_year3": "trade2.year", "bos_make3": "trade2.make", "bos_model3": "trade2.model", "bos_miles3": "trade2.miles", "bos_vin3": "trade2.vin",
+    "YEAR": "year", "MAKE": "make", "BODY STYLE": "bodystyle", "SERIES MODEL": "model", "VEHICLE IDENTIFICATION NUMBER": "vin",
+    "FUEL TYPE": "fuel_type", "ODOMETER READING": "odometer", "Owner 1 ID": "drivers_license",
+    "Full Legal Name of Owner 1 First Middle Last Suffix or Company Name": "customer", "Tax County": "county",
+    "Lienholder 1 name": "lienholder", "Address": "lienholder_address", "City": "lienholder_city", "State": "lienholder_state",
+    "Zip Code": "lienholder_zip", "Insurance Company authorized in NC": "ins_company", "Policy Number": "policy",
+    "mvr1_cb_New": "is_new", "mvr1_cb_Used": "is_used",
+    "mvr6tYear": "year", "mvr6tMake": "make", "mvr6tBodyStyle": "bodystyle", "mvr6tModel": "model", "mvr6tVIN": "vin",
+    "mvr6tFuel": "fuel_type", "mvr6tOwner 1 ID": "drivers_license",
+    "mvr6tFull Legal Name of Owner 1 First Middle Last Suffix or Company Name": "customer",
+    "mvr6tResidence Address Individual Business Address Firm": "address", "mvr6tZip": "zipcode", "mvr6tCounty": "county",
+    "mvr6tLienholder Name": "lienholder", "mvr6tLienAddress": "lienholder_address", "mvr6tLienCity": "lienholder_city",
+    "mvr6tLienState": "lienholder_state", "mvr6tLienZip": "lienholder_zip", "mvr6tNewcb": "is_new", "mvr6tUsedcb": "is_used",
+    "mvr63POABuyer": "customer", "mvr63POAVehYear": "year", "mvr63POAVehMake": "make", "mvr63VehBodyStyle": "bodystyle",
+    "mvr63VehModel": "model", "mvr63VehVIN": "vin", "mvr63POADealer": "dealer",
+    "mvr180Year": "year", "mvr180Make": "make", "mvr180BodyStyle": "bodystyle", "mvr180Model": "model", "mvr180VIN": "vin",
+    "mvr180Odometer": "odometer", "mvr180SellName": "dealer", "mvr180SellerName2": "dealer", "mvr180SellerAddress": "dealer_street",
+    "mvr180SellerCity": "dealer_city", "mvr180SellerState": "dealer_state", "mvr180SellerZip": "dealer_zip",
+    "mvr180BuyersName": "customer", "mvr180BuyersAddress": "address", "mvr180BuyerCity": "city", "mvr180BuyerState": "state",
+    "mvr180BuyersZip": "zipcode",
+    "mvr181Year": "year", "mvr181Make": "make", "mvr181BodyStyle": "bodystyle", "mvr181VIN": "vin",
+    "BUYERMVR63": "customer", "YEARMVR63": "trade1.year", "MAKEMVR63": "trade1.make", "MODELMVR63": "trade1.model", "VINMVR63": "trade1.vin",
+    "YEARMVR180": "trade1.year", "MAKEMVR180": "trade1.make", "MODELMVR180": "trade1.model", "VINMVR180": "trade1.vin",
+    "ODOMETERMVR180": "trade1.miles", "SELLERNAMEMVR180": "customer", "SELLERNAME2MVR180": "customer", "SELLERADDRESSMVR180": "address",
+    "SELLERCITYMVR180": "city", "SELLERSTATEMVR180": "state", "SELLERZIPMVR180": "zipcode", "BUYERNAMEMVR180": "dealer",
+    "BUYERADDRESSMVR180": "dealer_street", "BUYERCITYMVR180": "dealer_city", "BUYERSTATEMVR180": "dealer_state", "BUYERZIPMVR180": "dealer_zip",
+    "YEARMVR181": "trade1.year", "MAKEMVR181": "trade1.make", "VINMVR181": "trade1.vin",
+    "YEARMVR6TT": "year", "MAKEMVR6TT": "make", "BODYSTYLEMVR6TT": "bodystyle", "MODELMVR6TT": "model", "VINMVR6TT": "vin",
+    "FUELMVR6TT": "fuel_type", "OWNERIDMVR6TT": "drivers_license", "OWNERMVR6TT": "customer", "OWNERADDRESSMVR6TT": "address",
+    "CITYSTATEMVR6TT": "city", "ZIPMVR6TT": "zipcode", "COUNTYMVR6TT": "county", "LIENHOLDERMVR6TT": "lienholder",
+    "LIENADDRESSMVR6TT": "lienholder_address", "LIENCITYMVR6TT": "lienholder_city", "LIENSTATEMVR6TT": "lienholder_state",
+    "LIENZIPMVR6TT": "lienholder_zip",
+    "WONAME": "customer", "WOSTKNO": "stocknum", "WONEWUSED": "newused", "WOADDRESS": "address", "WOSTATE": "state", "WOYEAR": "year",
+    "WOMAKE": "make", "WOCITY": "city", "WOZIP": "zipcode", "WOMODEL": "model", "WOPHONE": "phone", "WOVIN": "vin", "WOEMAIL": "email",
+    "WOSALESPERSON": "consultant",
+    "CPBUYER": "customer", "CPSALESPERSON": "consultant", "CPINS": "ins_company", "CPMANAGER": "manager", "CPPOLICY": "policy",
+    "CPYEAR": "trade1.year", "CPMAKE": "trade1.make", "CPMODEL": "trade1.model",
+    "vinverifystock": "stocknum", "vinverifyvin": "vin", "vinverifymiles": "odometer", "vinverifytradevin": "trade1.vin",
+    "vinverifytrademiles": "trade1.miles",
+    "guidemake": "make", "guidemodel": "model", "guideyear": "year", "guidevin": "vin", "guidestock": "stocknum", "guidedealer": "dealer",
+    "LAWBUYCELL": "phone", "LAWBUYEMAIL": "email", "LAWYEAR": "year", "LAWVIN": "vin",
+    "LAWTRADEYEAR": "trade1.year", "LAWTRADEMAKE": "trade1.make", "LAWTRADEMODEL": "trade1.model",
+    "ins_ack_customer": "customer", "ins_ack_home": "phone", "ins_ack_license": "drivers_license", "ins_ack_state": "state",
+}
+_FI_GETTERS = tuple((name, attrgetter(path)) for name, path in _FI_ATTRIBUTES.items())
+
+_FI_BLANK = (
+    "bos_salesperson_no", "bos_salesperson2", "bos_salesperson2_no", "bos_deal_num", "box_cobuyer", "bos_cell", "bos_color",
+    "bos_bus_mgr", "bos_stock3", "bos_accessories", "bos_gap", "bos_vsc", "bos_vsctax",
+    "Check Box3", "Check Box4", "Check Box5", "This includes the truck trailer and load", "Check Box6", "Check Box7",
+    "Class of License", "Check Box8", "Check Box9", "Check Box10", "Owner 2 ID",
+    "Full Legal Name of Owner 2 First Middle Last Suffix or Company Name", "Check Box1", "Check Box2",
+    "Mail Address if different from above City and State Zip Code",
+    "Vehicle Location Address if different from residence address above City and State Zip Code",
+    "Account #1", "Account #2", "Text1", "Date 1", "Text2", "Date 2", "Lienholder 1 ID", "Lienholder 2 ID", "Lienholder 2 name",
+    "undefined", "Address_2", "City_2", "State_2", "Zip Code_2", "NC Dealer No", "Equipment",
+    "I We would like the personal information contained in this application to be available for disclosure",
+    "Date", "County", "State_3", "purpose stated therein and in the capacity indicated", "or Typed Name", "My Commission Expires",
+    "mvr6tOwner 2 ID", "mvr6tFull Legal Name of Owner 2 First Middle Last Suffix or Company Name",
+    "mvr6tMail Address if different from above", "mvr6tLienDate", "mvr6tLienMaturity",
+    "mvr6tFIRST LIEN Account  Maturity Date MH Date of Lien", "mvr6tDMVcb", "mvr6tOwnerState", "mvr6tPurchase Date",
+    "mvr6tPrevious NC Title Number", "mvr6tDealer", "mvr6tPrinted Firm Name", "mvr6tDealer_Date", "mvr6tDealer_County",
+    "mvr180CertifyMiles", "mvr180Discrepancy", "mvr180SellerDateCert", "mvr180BuyerDateCert", "mvr181Date",
+    "BODYSTYLEMVR63", "POANAMEMVR63", "BODYSTYLEMVR180", "ODOCERTCBMVR180", "ODOWARNCBMVR180", "SELLERDATEMVR180",
+    "BUYERDATEMVR180", "BODYSTYLEMVR181", "DATEMVR181", "LIENDATEMVR6TT", "LIENACCOUNTNOMVR6TT", "LIENHOLDERIDMVR6TT",
+    "BUYERDATEMVR6TT", "CAPACITYMVR6TT", "PRINCIPALSMVR6TT", "LAWBEGINPAY", "LAWCASHPRICE", "LAWGROSSTRADE",
+    "Less Pay Off Made By Seller to", "ins_ack_exp",
+)
+_FI_CHECKED = (
+    "No_2", "mvr181cbCollide", "mvr181cbSalvage", "mvr181cbFlood", "mvr181cbTheft", "mvr181cbRecon", "DAMAGECBNOMVR181",
+    "SALVAGECBNOMVR181", "FLOODCBNOMVR181", "THEFTCBNOMVR181", "RECONCBNOMVR181", "guidecb1",
+)
+_FI_CONSTANTS = {**dict.fromkeys(_FI_BLANK, ""), **dict.fromkeys(_FI_CHECKED, True), "mvr6tDealerState": "NC", "When Payments Are Due": 'Monthly'}
+
+def fi_form_data(deal, down_payment, rate, term, today=None):
+    today = today or datetime.today()
+    date = today.strftime('%m/%d/%Y')
+    day, month, year = today.strftime('%d'), today.strftime("%B"), today.strftime("%Y")
+    # Every amount on the forms is added up in whole cents and only formatted at the edge.
+    price_cents = to_cents(deal.market_value) - to_cents(deal.discount)
+    trade_cents, down_cents, taxes_cents = to_cents(deal.trade_value), to_cents(down_payment), to_cents(deal.taxes)
+    total_cents = price_cents - trade_cents
+    subtotal_cents = total_cents + to_cents(deal.doc_fee) + taxes_cents + to_cents(deal.non_tax_fees) + to_cents(deal.trade_payoff)
+    amount_financed_cents = subtotal_cents - to_cents(deal.rebate) - down_cents
+    law = dict.fromkeys(("LAWMONTHLYPAY", "LAWTOTALPAY", "LAWFINANCECHARGE", "LAWAMTFINANCED", "LAWTOTALCOST", "LAWNUMPAYMENTS"), '')
+    if not deal.lease:
+        monthly_payment, total_of_payments, finance_charge = (to_cents(float(v[0])) for v in loan_totals(from_cents(amount_financed_cents), rate, term))
+        law = {
+            "LAWMONTHLYPAY": format_cents(monthly_payment),
+            "LAWTOTALPAY": format_cents(total_of_payments),
+            "LAWFINANCECHARGE": format_cents(finance_charge),
+            "LAWAMTFINANCED": format_cents(amount_financed_cents),
+            "LAWTOTALCOST": format_cents(total_of_payments + down_cents),
+            "LAWNUMPAYMENTS": str(term),
+        }
+    buyer_address = f"{deal.address}, {deal.city}, {deal.state} {deal.zipcode}"
+    dealer_address = f"{deal.dealer_street}, {deal.dealer_city}, {deal.dealer_state_zip}"
+    dealer_block = f"{deal.dealer}\n{deal.dealer_street}\n{deal.dealer_city} {deal.dealer_state_zip}"
+    data = {name: getter(deal) for name, getter in _FI_GETTERS}
+    data.update(_FI_CONSTANTS)
+    data.update(law)
+    data.update({
+        "bos_date": date, "Purchase Date": date, "WODELDATE": date, "CPDATE": date, "guidedate": date, "ins_ack_date": date,
+        "mvr63POADay": day, "mvr63POAMonth": month, "mvr63WitYear": year, "DAYMVR63": day, "MONTHMVR63": month, "WITYEARMVR63": year,
+        "bos_stock2": modify_stocknum(deal.stocknum) if deal.trade_value > 0 else "",
+        "bos_vehicle_price": format_cents(price_cents),
+        "bos_trade_value": format_cents(trade_cents),
+        "bos_total": format_cents(total_cents),
+        "bos_docfee": format_cents(to_cents(deal.doc_fee)),
+        "bos_taxes": format_cents(taxes_cents),
+        "bos_tagfees": format_cents(to_cents(deal.non_tax_fees) - 1100),
+        "bos_titlefee": format_cents(1100),
+        "bos_payoff": format_cents(to_cents(deal.trade_payoff)),
+        "bos_subtotal": format_cents(subtotal_cents),
+        "bos_downpayment": format_cents(down_cents),
+        "bos_rebate": format_cents(to_cents(deal.rebate)),
+        "bos_balance": format_cents(amount_financed_cents),
+        "LAWDOWNPAY": format_cents(down_cents),
+        "LAWCASHDOWNPAY": format_cents(down_cents),
+        "LAWSALESTAX": format_cents(taxes_cents),
+        "LAWRATE": f"{rate:.2f}",
+        "CPPAYOFFAMT": "  $" + format_cents(to_cents(deal.trade1.payoff), grouping=True),
+        "List Plate Number and Expiration": f"{deal.platenum}           {deal.plate_exp}",
+        "Residence Address Individual Business Address Firm City and State Zip Code": f'{deal.address}         {deal.city}, {deal.state}         {deal.zipcode}',
+        "mvr6tCityState": f'{deal.city}     {deal.state}',
+        "From Whom Purchased Name and Address": dealer_block,
+        "SellerCreditor Name and Address": dealer_block,
+        "mvr181SellerAddress": dealer_address,
+        "guideaddress": dealer_address,
+        "SELLERADDRESSMVR181": buyer_address,
+        "ins_ack_address": buyer_address,
+        "LAWBUYER": f'{deal.customer}\n{deal.address}\n{deal.city}, {deal.state} {deal.zipcode}',
+        "LAWNEWSUSED": "NEW" if deal.is_new else "USED",
+        "LAWMAKEMODEL": f"{deal.make} {deal.model}",
+        "ins_ack_vehicle": f"{deal.year}  {deal.make}   {deal.model}    {deal.vin}",
+    })
+    return data
+
+_QUOTE_ATTRIBUTES = {
+    "dealer": "dealer", "salesperson": "consultant", "manager": "manager", "buyer": "customer", "address": "address", "city": "city",
+    "state": "state", "zip": "zipcode", "cell_phone": "phone", "email_add": "email", "newused": "newused", "year": "year",
+    "make": "make", "model": "model", "trim": "trim", "stock_no": "stocknum", "vin": "vin", "miles": "odometer",
+    "trade_year": "trade1.year", "trade_make": "trade1.make", "trade_model": "trade1.model", "trade_vin": "trade1.vin",
+    "trade_miles": "trade1.miles", "trade_value": "trade_value", "trade_payoff": "trade_payoff", "trade_acv": "trade_acv",
+    "trade_year_2": "trade2.year", "trade_make_2": "trade2.make", "trade_model_2": "trade2.model", "trade_vin_2": "trade2.vin",
+    "trade_miles_2": "trade2.miles", "sale_price": "market_value", "discount": "discount", "rebate": "rebate", "doc_fee": "doc_fee",
+    "sales_tax": "taxes", "non_tax_fees": "non_tax_fees",
+}
+_QUOTE_GETTERS = tuple((name, attrgetter(path)) for name, path in _QUOTE_ATTRIBUTES.items())
+
+def quote_form_data(deal, grid, balance, schedule=None, today=None):
+    data = {name: getter(deal) for name, getter in _QUOTE_GETTERS}
+    data.update({
+        'date': (today or datetime.today()).strftime('%m/%d/%Y'),
+        'balance': balance,
+        'quotes': grid.quotes(),
+        'schedule': schedule,
+    })
+    return data
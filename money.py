@@ -0,0 +1,45 @@
+import math
+import numpy as np
+
+# Money is carried as integer cents: a Python int for one amount, an int64 array for a batch. Rates stay floats, and
+# anything a rate produces is rounded half-up (away from zero) back to whole cents once, so sums of amounts never
+# drift. NaN and infinity are not amounts: both paths raise ValueError rather than invent a figure.
+_HALF_UP = 0.5 + 1e-9
+
+def round_half_up(cents):
+    if isinstance(cents, (np.ndarray, list, tuple)):
+        cents = np.asarray(cents, dtype=float)
+        if not np.isfinite(cents).all():
+            raise ValueError("amount is not a finite number")
+        return (np.sign(cents) * np.floor(np.abs(cents) + _HALF_UP)).astype(np.int64)
+    if not math.isfinite(cents):
+        raise ValueError("amount is not a finite number")
+    rounded = math.floor(abs(cents) + _HALF_UP)
+    return rounded if cents >= 0 else -rounded
+
+def to_cents(amount):
+    if isinstance(amount, (np.ndarray, list, tuple)):
+        return round_half_up(np.asarray(amount, dtype=float) * 100)
+    if not amount:
+        return 0
+    return round_half_up(float(amount) * 100)
+
+def from_cents(cents):
+    return cents / 100
+
+def format_cents(cents, grouping=False):
+    sign = "-" if cents < 0 else ""
+    dollars, cents = divmod(abs(int(cents)), 100)
+    return f"{sign}{dollars:,}.{cents:02d}" if grouping else f"{sign}{dollars}.{cents:02d}"
+
+def payment_cents(principal_cents, annual_rate, term_months):
+    if not isinstance(principal_cents, np.ndarray) and np.isscalar(annual_rate) and np.isscalar(term_months):
+        monthly_rate = annual_rate / 100 / 12
+        if monthly_rate == 0:
+            return round_half_up(principal_cents / term_months)
+        return round_half_up(principal_cents * monthly_rate / (1 - (1 + monthly_rate) ** -term_months))
+    monthly_rate = np.asarray(annual_rate, dtype=float) / 100 / 12
+    term_months = np.asarray(term_months, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        amortized = principal_cents * monthly_rate / (1 - (1 + monthly_rate) ** -term_months)
+    return round_half_up(np.where(monthly_rate == 0, principal_cents / term_months, amortized))
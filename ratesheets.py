@@ -0,0 +1,109 @@
+import argparse, csv, os
+import numpy as np
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+RATE_SHEETS_PATH = os.environ.get("QUOTE_RATE_SHEETS", os.path.join(DATA_DIR, "rate_sheets.csv"))
+EXAMPLE_RATE_SHEETS_PATH = os.path.join(DATA_DIR, "rate_sheets.example.csv")
+
+# One row per lender program. Finance rows carry an APR in rate; lease rows carry a money factor in rate and the
+# residual (fraction of MSRP) for that term and annual mileage. Blank year, LTV or miles bounds match anything.
+# markup is how far over the buy rate the dealer may sell, and reserve_share the part of that markup's finance charge
+# the lender pays back as dealer reserve.
+Program = namedtuple("Program", "lender product tier min_year max_year max_term max_ltv miles rate residual markup reserve_share")
+
+def _number(value, kind=float, default=0):
+    value = (value or "").strip()
+    return kind(value) if value else default
+
+def read_programs(path=RATE_SHEETS_PATH):
+    with open(path, newline="") as f:
+        return [Program(
+            row["lender"].strip().upper(), row["product"].strip().lower(), row["tier"].strip().upper(),
+            _number(row.get("min_year"), int, 0), _number(row.get("max_year"), int, 9999),
+            _number(row.get("max_term"), int), _number(row.get("max_ltv"), float, float("inf")),
+            _number(row.get("miles"), int), _number(row.get("rate")), _number(row.get("residual")),
+            _number(row.get("markup")), _number(row.get("reserve_share")),
+        ) for row in csv.DictReader(f)]
+
+def program_key(program):
+    return "" if program is None else "|".join(str(value) for value in program)
+
+class RateSheet:
+    def __init__(self, programs):
+        # (lender, product, tier, miles) -> term ceilings, sorted, with each term band's programs sorted by LTV
+        # ceiling, so a lookup bisects to the first band that can cover the deal and usually stops there.
+        cells = defaultdict(lambda: defaultdict(list))
+        for program in programs:
+            cells[program.lender, program.product, program.tier, program.miles][program.max_term].append(program)
+        self.index = {}
+        for key, by_term in cells.items():
+            terms = sorted(by_term)
+            bands = []
+            for term in terms:
+                rows = sorted(by_term[term], key=lambda program: (program.max_ltv, program.rate))
+                bands.append(([program.max_ltv for program in rows], rows))
+            self.index[key] = (terms, bands)
+        self.programs = programs
+        # The same programs as columns, in lookup order, for pricing every lender at once.
+        ordered = sorted(programs, key=lambda program: (program.lender, program.product, program.tier, program.miles, program.max_term, program.max_ltv, program.rate))
+        self.table = {field: np.array([getattr(program, field) for program in ordered]) for field in Program._fields}
+
+    @classmethod
+    def load(cls, path=RATE_SHEETS_PATH):
+        return cls(read_programs(path))
+
+    def lenders(self, product):
+        return sorted({lender for lender, kind, _, _ in self.index if kind == product})
+
+    def tiers(self, lender, product):
+        return sorted({tier for name, kind, tier, _ in self.index if name == lender and kind == product})
+
+    def mileages(self, lender, product):
+        return sorted({miles for name, kind, _, miles in self.index if name == lender and kind == product})
+
+    def program(self, lender, product, tier, term, year=None, ltv=0, miles=0):
+        # The first program, by term ceiling then LTV ceiling, that covers term, ltv and year; None if there is none.
+        cell = self.index.get((lender, product, tier, miles))
+        if cell is None:
+            return None
+        terms, bands = cell
+        for ltvs, rows in bands[bisect_left(terms, term):]:
+            for program in rows[bisect_left(ltvs, ltv):]:
+                if year is None or program.min_year <= year <= program.max_year:
+                    return program
+        return None
+
+@lru_cache(maxsize=1)
+def _load_rate_sheet(path, mtime):
+    return RateSheet.load(path)
+
+def default_rate_sheet():
+    # None when no sheet is installed. Replacing the file is picked up on the next call without a restart.
+    try:
+        mtime = os.stat(RATE_SHEETS_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _load_rate_sheet(RATE_SHEETS_PATH, mtime)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look up the lender program for a deal.")
+    parser.add_argument("lender")
+    parser.add_argument("tier")
+    parser.add_argument("term", type=int)
+    parser.add_argument("--lease", action="store_true")
+    parser.add_argument("--year", type=int)
+    parser.add_argument("--ltv", type=float, default=0)
+    parser.add_argument("--miles", type=int, default=0)
+    parser.add_argument("--sheet", default=RATE_SHEETS_PATH, help="rate sheet CSV (see data/rate_sheets.example.csv)")
+    args = parser.parse_args(argv)
+    sheet = RateSheet.load(args.sheet)
+    program = sheet.program(args.lender.upper(), "lease" if args.lease else "finance", args.tier.upper(), args.term, args.year, args.ltv, args.miles)
+    if program is None:
+        parser.exit(1, "No matching program\n")
+    print(program)
+
+if __name__ == "__main__":
+    main()
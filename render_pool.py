@@ -0,0 +1,114 @@
+import os, select, subprocess, sys, threading, time
+from render_worker import render_quote_pdf, render_fi_pdf, read_message, write_message
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "render_worker.py")
+
+class RenderPoolBusy(Exception):
+    pass
+
+class RenderTimeout(Exception):
+    pass
+
+class RenderWorkerDied(Exception):
+    pass
+
+class _Worker:
+    # A fresh interpreter running render_worker.py rather than a fork of the server: the server is multithreaded,
+    # and a forked child can inherit a lock (logging, reportlab, the metrics writer) held mid-operation.
+    def __init__(self):
+        self.process = subprocess.Popen([sys.executable, WORKER_SCRIPT], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def run(self, fn, args, deadline):
+        write_message(self.process.stdin, (fn, args))
+        ready, _, _ = select.select([self.process.stdout], [], [], max(deadline - time.monotonic(), 0))
+        if not ready:
+            raise TimeoutError
+        try:
+            return read_message(self.process.stdout)
+        except EOFError:
+            raise RenderWorkerDied(f"PDF worker exited with code {self.process.wait()}") from None
+
+    def stop(self):
+        self.process.kill()
+        self.process.wait()
+
+class RenderPool:
+    def __init__(self, workers=None, max_pending=8, timeout=60):
+        self.workers = workers or min(2, os.cpu_count() or 1)
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._running = threading.BoundedSemaphore(self.workers)
+        self._lock = threading.Lock()
+        self._idle = []
+
+    def _checkout(self):
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.poll() is None:
+                    return worker
+        return _Worker()
+
+    def render(self, fn, *args, timeout=None):
+        # The timeout covers waiting for a free worker as well as the render. A job that runs over it has its own
+        # worker killed and replaced; jobs from other sessions keep running on theirs.
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise RenderPoolBusy(f"PDF queue is full ({self.max_pending} jobs pending)")
+        with self._lock:
+            self.pending += 1
+        try:
+            if not self._running.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                raise TimeoutError
+            try:
+                worker = self._checkout()
+                try:
+                    ok, result = worker.run(fn, args, deadline)
+                except (TimeoutError, RenderWorkerDied, OSError):
+                    worker.stop()
+                    raise
+                with self._lock:
+                    self._idle.append(worker)
+            finally:
+                self._running.release()
+        except TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            raise RenderTimeout(f"PDF rendering took longer than {timeout}s") from None
+        finally:
+            with self._lock:
+                self.pending -= 1
+            self._slots.release()
+        if not ok:
+            # An error raised by the job itself, such as a missing template; the worker is fine and stays idle.
+            raise result
+        return result
+
+    def render_quote(self, data, timeout=None):
+        return self.render(render_quote_pdf, data, timeout=timeout)
+
+    def fill_fi(self, in_path, data, timeout=None):
+        return self.render(render_fi_pdf, in_path, data, timeout=timeout)
+
+    def load(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
@@ -0,0 +1,50 @@
+import pickle, struct, sys
+
+# Entry point for RenderPool worker processes. It is started as a fresh interpreter, so it only imports the PDF
+# stack: never the Streamlit page, and never a lock some server thread was holding at fork time.
+_HEADER = struct.Struct("!Q")
+
+def render_quote_pdf(data):
+    from documents import generate_pdf
+    return generate_pdf(data, filename=None)
+
+def render_fi_pdf(in_path, data):
+    from documents import fill_fi_pdf
+    return fill_fi_pdf(in_path, None, data)
+
+def write_message(f, message):
+    payload = pickle.dumps(message)
+    f.write(_HEADER.pack(len(payload)) + payload)
+    f.flush()
+
+def read_message(f):
+    header = f.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        raise EOFError("render worker closed its pipe")
+    size, = _HEADER.unpack(header)
+    payload = f.read(size)
+    if len(payload) < size:
+        raise EOFError("render worker closed its pipe")
+    return pickle.loads(payload)
+
+def main():
+    # One job at a time: a pickled (fn, args) in on stdin, a pickled (ok, result or exception) out on stdout.
+    jobs, results = sys.stdin.buffer, sys.stdout.buffer
+    sys.stdout = sys.stderr
+    import documents
+    while True:
+        try:
+            fn, args = read_message(jobs)
+        except EOFError:
+            return
+        try:
+            reply = (True, fn(*args))
+        except Exception as e:
+            reply = (False, e)
+        try:
+            write_message(results, reply)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            write_message(results, (False, RuntimeError(repr(reply[1]))))
+
+if __name__ == "__main__":
+    main()
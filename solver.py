@@ -0,0 +1,76 @@
+import numpy as np
+from taxes import default_tax_table
+
+# Same flat rate calculate_lease_payment applies to each lease payment.
+LEASE_TAX_RATE = 0.03
+
+# Finance payments invert in closed form from the annuity factor; arguments broadcast, so a whole grid of targets
+# solves in one call. Results come back as arrays; unreachable targets come back as inf.
+def annuity_factor(annual_rate, term_months):
+    monthly_rate = np.asarray(annual_rate, dtype=float) / 100 / 12
+    term_months = np.asarray(term_months, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = (1 - (1 + monthly_rate) ** -term_months) / monthly_rate
+    return np.where(monthly_rate == 0, term_months, factor)
+
+def required_down_payment(target_payment, principal, annual_rate, term_months):
+    return np.maximum(principal - np.asarray(target_payment, dtype=float) * annuity_factor(annual_rate, term_months), 0)
+
+def minimum_term(target_payment, principal, down_payment, annual_rate):
+    target_payment = np.asarray(target_payment, dtype=float)
+    financed = np.asarray(principal, dtype=float) - down_payment
+    monthly_rate = np.asarray(annual_rate, dtype=float) / 100 / 12
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = financed * monthly_rate / target_payment
+        terms = np.where(monthly_rate == 0, financed / target_payment, -np.log1p(-ratio) / np.log1p(monthly_rate))
+    terms = np.where((ratio >= 1) | (target_payment <= 0), np.inf, terms)
+    return np.maximum(np.ceil(terms - 1e-9), 1)
+
+def max_market_value(target_payment, down_payment, annual_rate, term_months, state, discount=0, rebate=0, trade_value=0, trade_payoff=0, doc_fee=0, non_tax_fees=0, county=None, zipcode=None, tolerance=0.005, max_iterations=25):
+    # Taxes depend on the price through whatever rule the jurisdiction uses, so this one is solved with Newton steps.
+    # Every bundled rule type is piecewise linear in the price, which converges in a handful of iterations.
+    rule = default_tax_table().rule_for(state, county, zipcode)
+
+    def taxes(price):
+        if rule is None:
+            return np.zeros_like(price)
+        return np.maximum(rule(np.maximum(price - discount - trade_value + doc_fee, 0)), 0)
+
+    supported_balance = np.asarray(target_payment, dtype=float) * annuity_factor(annual_rate, term_months) + down_payment
+    fixed = -discount - rebate - trade_value + trade_payoff + doc_fee + non_tax_fees
+    price = supported_balance - fixed
+    for _ in range(max_iterations):
+        error = price + taxes(price) + fixed - supported_balance
+        if np.all(np.abs(error) < tolerance):
+            break
+        price = price - error / (1 + taxes(price + 1) - taxes(price))
+    return price
+
+# Lease payments are linear in the down payment and the market value, so those solve in closed form too.
+def lease_required_down_payment(target_payment, market_value, doc_fee, non_tax_fees, doc, rebate, money_factor, term_months, residual_percentage, trade_value, trade_payoff, discount):
+    pre_tax = np.asarray(target_payment, dtype=float) / (1 + LEASE_TAX_RATE)
+    money_factor = np.asarray(money_factor, dtype=float)
+    term_months = np.asarray(term_months, dtype=float)
+    residual_value = market_value * np.asarray(residual_percentage, dtype=float)
+    adjusted_cap_cost = (pre_tax + residual_value * (1 / term_months - money_factor)) / (1 / term_months + money_factor)
+    gross_cap_cost = market_value - discount + doc_fee + non_tax_fees + doc
+    return np.maximum(gross_cap_cost - rebate - (trade_value - trade_payoff) - adjusted_cap_cost, 0)
+
+def lease_max_market_value(target_payment, doc_fee, non_tax_fees, doc, down_payment, rebate, money_factor, term_months, residual_percentage, trade_value, trade_payoff, discount):
+    pre_tax = np.asarray(target_payment, dtype=float) / (1 + LEASE_TAX_RATE)
+    money_factor = np.asarray(money_factor, dtype=float)
+    term_months = np.asarray(term_months, dtype=float)
+    residual_percentage = np.asarray(residual_percentage, dtype=float)
+    fixed = -discount + doc_fee + non_tax_fees + doc - (down_payment + rebate + (trade_value - trade_payoff))
+    per_dollar = (1 - residual_percentage) / term_months + (1 + residual_percentage) * money_factor
+    return (pre_tax - fixed / term_months - fixed * money_factor) / per_dollar
+
+def lease_minimum_term(target_payment, market_value, doc_fee, non_tax_fees, doc, down_payment, rebate, money_factor, residual_percentage, trade_value, trade_payoff, discount):
+    pre_tax = np.asarray(target_payment, dtype=float) / (1 + LEASE_TAX_RATE)
+    residual_value = market_value * np.asarray(residual_percentage, dtype=float)
+    adjusted_cap_cost = market_value - discount + doc_fee + non_tax_fees + doc - (down_payment + rebate + (trade_value - trade_payoff))
+    monthly_rent_charge = (adjusted_cap_cost + residual_value) * np.asarray(money_factor, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = (adjusted_cap_cost - residual_value) / (pre_tax - monthly_rent_charge)
+    terms = np.where(pre_tax <= monthly_rent_charge, np.inf, terms)
+    return np.maximum(np.ceil(terms - 1e-9), 1)
@@ -0,0 +1,143 @@
+import json, os
+import numpy as np
+from functools import lru_cache
+
+TAX_RULES_PATH = os.environ.get("QUOTE_TAX_RULES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tax_rules.json"))
+
+# Every rule takes the taxable amount as a float or an ndarray and returns the same shape.
+class PercentRule:
+    __slots__ = ("rate",)
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+
+    def __call__(self, taxable):
+        return taxable * self.rate
+
+class FlatRule:
+    __slots__ = ("amount",)
+
+    def __init__(self, amount):
+        self.amount = float(amount)
+
+    def __call__(self, taxable):
+        return taxable * 0 + self.amount
+
+class CappedRule:
+    __slots__ = ("rate", "cap", "minimum")
+
+    def __init__(self, rate, cap, minimum=0):
+        self.rate = float(rate)
+        self.cap = float(cap)
+        self.minimum = float(minimum)
+
+    def __call__(self, taxable):
+        return np.clip(taxable * self.rate, self.minimum, self.cap)
+
+class TieredRule:
+    __slots__ = ("lows", "widths", "rates")
+
+    def __init__(self, brackets):
+        # Brackets are [from_amount, rate] pairs; each rate applies only to the part of the amount inside its bracket.
+        brackets = sorted((float(low), float(rate)) for low, rate in brackets)
+        self.lows = np.array([low for low, _ in brackets])
+        self.widths = np.diff(np.append(self.lows, np.inf))
+        self.rates = np.array([rate for _, rate in brackets])
+
+    def __call__(self, taxable):
+        portions = np.clip(np.asarray(taxable, dtype=float)[..., None] - self.lows, 0, self.widths)
+        return portions @ self.rates
+
+RULE_TYPES = {
+    "percent": lambda spec: PercentRule(spec["rate"]),
+    "flat": lambda spec: FlatRule(spec["amount"]),
+    "capped": lambda spec: CappedRule(spec["rate"], spec["cap"], spec.get("minimum", 0)),
+    "tiered": lambda spec: TieredRule(spec["brackets"]),
+}
+
+def compile_rule(spec):
+    try:
+        return RULE_TYPES[spec["type"]](spec)
+    except KeyError as e:
+        raise ValueError(f"Invalid tax rule {spec!r}: missing or unknown {e}") from None
+
+def _county_key(county):
+    county = county.strip().upper()
+    return county[:-7] if county.endswith(" COUNTY") else county
+
+def _row_keys(columns):
+    # One fixed-width void value per row spanning every column, so np.unique groups the rows in a single sort.
+    matrix = np.concatenate([column.view(np.uint32).reshape(len(column), column.itemsize // 4) for column in columns], axis=1)
+    return np.ascontiguousarray(matrix).view(np.dtype((np.void, matrix.shape[1] * 4))).ravel()
+
+def _group_rows(columns):
+    # The first row of each distinct key and a group id per row. NumPy string columns are grouped by np.unique over
+    # packed rows. Python lists go through a dict: turning them into arrays costs more than the whole grouping, at
+    # any number of distinct keys (20,000 rows: 4-9 ms by dict, 12-16 ms converted and unique'd).
+    if all(isinstance(column, np.ndarray) and column.dtype.kind == "U" for column in columns):
+        _, first, group_ids = np.unique(_row_keys(columns), return_index=True, return_inverse=True)
+        return first.tolist(), group_ids.ravel()
+    seen = {}
+    first = []
+    group_ids = np.empty(len(columns[0]), dtype=np.intp)
+    for i, key in enumerate(zip(*columns)):
+        group_id = seen.get(key)
+        if group_id is None:
+            group_id = seen[key] = len(first)
+            first.append(i)
+        group_ids[i] = group_id
+    return first, group_ids
+
+class TaxTable:
+    def __init__(self, states, counties=None, zips=None):
+        self.states = {state.upper(): compile_rule(spec) for state, spec in states.items()}
+        self.counties = {
+            (state.upper(), _county_key(county)): compile_rule(spec)
+            for state, county_specs in (counties or {}).items()
+            for county, spec in county_specs.items()
+        }
+        self.zips = {str(zipcode).zfill(5): compile_rule(spec) for zipcode, spec in (zips or {}).items()}
+
+    @classmethod
+    def load(cls, path=TAX_RULES_PATH):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data.get("states", {}), data.get("counties"), data.get("zips"))
+
+    def rule_for(self, state, county=None, zipcode=None):
+        # The most specific rule wins: ZIP, then county, then state. None means the jurisdiction is not taxed here.
+        if zipcode and self.zips:
+            rule = self.zips.get(str(zipcode).strip()[:5])
+            if rule is not None:
+                return rule
+        state = (state or "").strip().upper()
+        if county and self.counties:
+            rule = self.counties.get((state, _county_key(county)))
+            if rule is not None:
+                return rule
+        return self.states.get(state)
+
+    def tax(self, state, taxable, county=None, zipcode=None):
+        rule = self.rule_for(state, county, zipcode)
+        if rule is None:
+            return 0.00
+        return max(float(rule(taxable)), 0)
+
+    def tax_array(self, states, taxable, counties=None, zipcodes=None):
+        taxable = np.asarray(taxable, dtype=float)
+        # rule_for runs once per distinct (state, county, ZIP) rather than once per row.
+        first, rule_ids = _group_rows([values for values in (states, counties, zipcodes) if values is not None])
+        rules = [self.rule_for(states[i], None if counties is None else counties[i], None if zipcodes is None else zipcodes[i]) for i in first]
+        # One sort splits the rows by rule, rather than a full-length mask per rule.
+        order = np.argsort(rule_ids, kind="stable")
+        bounds = np.searchsorted(rule_ids[order], np.arange(len(rules) + 1))
+        taxes = np.zeros_like(taxable)
+        for rule, start, end in zip(rules, bounds[:-1].tolist(), bounds[1:].tolist()):
+            if rule is not None:
+                rows = order[start:end]
+                taxes[rows] = rule(taxable[rows])
+        return np.maximum(taxes, 0)
+
+@lru_cache(maxsize=None)
+def default_tax_table():
+    return TaxTable.load()
@@ -0,0 +1,65 @@
+import csv, io, json
+import pytest
+import batch_quote
+from batch_quote import OUTPUT_FIELDS, normalize_deal, price_chunk, run_batch
+
+def run(text, in_fmt="csv", out_fmt="csv", **kwargs):
+    out = io.StringIO()
+    count = run_batch(io.StringIO(text), out, in_fmt, out_fmt, workers=0, **kwargs)
+    out.seek(0)
+    rows = list(csv.DictReader(out)) if out_fmt == "csv" else [json.loads(line) for line in out]
+    assert len(rows) == count
+    return rows
+
+def test_csv_finance_row_prices_every_term_and_down_payment():
+    rows = run("id,market_value,state\nA1,30000,NC\n")
+    assert len(rows) == 9
+    assert list(rows[0]) == OUTPUT_FIELDS + ["error"]
+    first = rows[0]
+    assert (first["id"], first["type"], first["state"], first["taxes"], first["balance"]) == ("A1", "finance", "NC", "923.97", "31847.97")
+    assert (first["term"], first["rate"], first["down_payment"], first["payment"], first["error"]) == ("36", "14.0", "1000.0", "1054.31", "")
+    assert [row["term"] for row in rows] == ["36"] * 3 + ["60"] * 3 + ["72"] * 3
+
+def test_csv_lists_and_lease_rows():
+    rows = run("market_value,state,lease,terms,rates,down_payments,residuals\n30000,SC,yes,24;48,0.002|0.003,0;500,0.6;0.5\n")
+    assert len(rows) == 4
+    assert {row["type"] for row in rows} == {"lease"}
+    assert [(row["term"], row["rate"], row["residual"]) for row in rows[::2]] == [("24", "0.002", "0.6"), ("48", "0.003", "0.5")]
+    assert rows[0]["taxes"] == "500.0"
+
+def test_jsonl_rows_and_output():
+    text = json.dumps({"id": 7, "market_value": 30000, "state": "NC", "terms": [36], "down_payments": [1000]}) + "\n\n"
+    rows = run(text, "jsonl", "jsonl")
+    assert rows == [{"id": 7, "type": "finance", "state": "NC", "taxes": 923.97, "balance": 31847.97, "term": 36, "rate": 14.0, "residual": "", "down_payment": 1000.0, "payment": 1054.31}]
+
+def test_jsonl_bad_lines_become_error_rows():
+    text = '{"market_value": 30000, "state": "NC", "terms": "36", "down_payments": "0"}\n{"market_value": 3\n[1, 2]\n{"market_value": 20000, "terms": "36", "down_payments": "0"}\n'
+    rows = run(text, "jsonl", "jsonl")
+    assert [row["id"] for row in rows] == [1, 2, 3, 4]
+    assert rows[1]["error"].startswith("line 2: invalid JSON")
+    assert rows[2]["error"] == "line 3: expected a JSON object"
+    assert "error" not in rows[0] and "error" not in rows[3]
+
+@pytest.mark.parametrize("raw, message", [
+    ({"market_value": "abc"}, "could not convert"),
+    ({"market_value": "nan"}, "not a finite number"),
+    ({"market_value": "30000", "terms": "36;60", "rates": "7"}, "rates has 1 values for 2 terms"),
+    ({"market_value": "30000", "lease": "1", "terms": "36;48", "residuals": "0.6"}, "residuals has 1 values for 2 terms"),
+])
+def test_invalid_rows_name_the_problem(raw, message):
+    with pytest.raises(ValueError, match=message):
+        normalize_deal(raw, 1)
+    [row] = price_chunk([(1, raw)])
+    assert message in row["error"] and row["id"] == 1
+
+def test_finance_rows_ignore_residuals():
+    deal, grid = normalize_deal({"market_value": "30000", "terms": "36;60", "residuals": "0.6"}, 1)
+    assert not deal.lease and len(grid.terms) == 2
+
+def test_chunk_tax_failure_falls_back_to_per_row(monkeypatch):
+    def broken(deals):
+        raise ValueError("vectorized pass failed")
+    monkeypatch.setattr(batch_quote, "chunk_taxes", broken)
+    rows = price_chunk([(1, {"market_value": "30000", "state": "NC", "terms": "36", "down_payments": "0"}), (2, {"market_value": "x"})])
+    assert rows[0]["taxes"] == 923.97
+    assert "error" in rows[1] and rows[1]["id"] == 2
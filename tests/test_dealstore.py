@@ -0,0 +1,69 @@
+import pytest
+from dealstore import DealStore, restore_state, snapshot_state
+from models import Deal
+
+@pytest.fixture
+def store(tmp_path):
+    store = DealStore(str(tmp_path / "deals.db"))
+    yield store
+    store.close()
+
+def save(store, deal_id=None, **fields):
+    deal = Deal(**fields)
+    return store.save(deal, {"customer": deal.customer, "market_value": deal.market_value}, deal_id)
+
+def test_save_load_and_update(store):
+    deal_id = save(store, customer="Jane Smith", phone="(704) 555-1234", market_value=30000.0)
+    assert store.load(deal_id) == {"customer": "Jane Smith", "market_value": 30000.0}
+    assert save(store, deal_id, customer="Jane Smith", market_value=28500.0) == deal_id
+    assert store.load(deal_id)["market_value"] == 28500.0
+    assert len(store.recent()) == 1
+    assert store.load(deal_id + 1) is None
+
+def test_saved_summary_is_normalized(store):
+    save(store, customer="  Jane Smith ", phone="704.555.1234", email=" Jane@Example.com", vin="1hgcm82633a004352", stocknum=" A123 ", lease=True)
+    summary, = store.recent()
+    assert (summary.kind, summary.customer, summary.phone, summary.email, summary.vin, summary.stocknum) == ("lease", "Jane Smith", "7045551234", "jane@example.com", "1HGCM82633A004352", "A123")
+
+def test_find_by_name_phone_email_vin_and_stock(store):
+    jane = save(store, customer="Jane Smith", phone="704-555-1234", email="jane@example.com", vin="1HGCM82633A004352", stocknum="A123")
+    bob = save(store, customer="Bob Jones", phone="980-555-9876", stocknum="B456")
+    for query, expected in [
+        ("smith", [jane]), ("Jan", [jane]), ("jones bob", [bob]), ("555-1234", [jane]), ("9876", [bob]), ("(980) 555-9876", [bob]),
+        ("example", [jane]), ("1hgcm82633a004352", [jane]), ("b456", [bob]), ("nobody", []),
+    ]:
+        assert [found.id for found in store.find(query)] == expected, query
+
+def test_find_widens_misspelled_words(store):
+    jane = save(store, customer="Jane Smithson")
+    assert [found.id for found in store.find("smtihson")] == [jane]
+    assert [found.id for found in store.find("")] == [jane]
+
+def test_find_duplicates(store):
+    first = save(store, customer="Jane Smith", phone="704-555-1234")
+    second = save(store, customer="J Smith", email="jane@example.com")
+    save(store, customer="Bob Jones", phone="980-555-9876")
+    matches = store.find_duplicates(Deal(customer="jane smith", phone="7045551234", email="JANE@example.com"))
+    assert {found.id for found in matches} == {first, second}
+    assert store.find_duplicates(Deal(customer="Jane Smith", phone="704-555-1234"), deal_id=first) == []
+    # Short phone fragments and blank fields match nothing.
+    assert store.find_duplicates(Deal(phone="1234")) == []
+
+def test_snapshot_skips_computed_and_store_keys():
+    state = {"finance_customer": "Jane", "finance_market_value": 30000.0, "finance_taxes": 900.0, "finance_store_query": "jane",
+             "finance_trades": [1, 2], "lease_customer": "Bob"}
+    assert snapshot_state(state, "finance") == {"customer": "Jane", "market_value": 30000.0}
+
+def test_restore_replaces_the_open_deal():
+    state = {"finance_customer": "Bob", "finance_rebate": 500.0, "finance_taxes": 900.0, "lease_customer": "Ann"}
+    restore_state(state, "finance", {"customer": "Jane", "market_value": 30000.0})
+    assert state == {"finance_customer": "Jane", "finance_market_value": 30000.0, "finance_taxes": 900.0, "lease_customer": "Ann"}
+
+def test_reopening_existing_file_keeps_deals(tmp_path):
+    path = str(tmp_path / "deals.db")
+    store = DealStore(path)
+    deal_id = save(store, customer="Jane Smith")
+    store.close()
+    store = DealStore(path)
+    assert [found.id for found in store.find("jane")] == [deal_id]
+    store.close()
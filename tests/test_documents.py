@@ -0,0 +1,40 @@
+import io, zipfile
+import pdfrw
+from documents import generate_pdf, generate_pdfs
+
+QUOTE = {
+    'date': '01/02/2026', 'salesperson': 'Sam', 'manager': 'Max', 'buyer': 'Jane Doe', 'address': '1 Main', 'city': 'Concord',
+    'state': 'NC', 'zip': '28027', 'email_add': 'j@x.com', 'cell_phone': '555', 'year': '2024', 'make': 'NISSAN', 'model': 'ROGUE',
+    'trim': 'SV', 'stock_no': 'N123', 'vin': 'JN8AT3BB1RW000000', 'miles': '10', 'trade_vin': '', 'trade_vin_2': '',
+    'sale_price': 30000.0, 'discount': 500.0, 'rebate': 1000.0, 'doc_fee': 799.0, 'sales_tax': 900.0, 'non_tax_fees': 125.0,
+    'balance': 27000.0, 'trade_value': 0.0, 'trade_payoff': 0.0,
+    'quotes': {36: {1000.0: 800.12, 2000.0: 770.5}, 60: {1000.0: 500.0, 2000.0: 480.0}},
+}
+# Too tall for a page: reportlab raises LayoutError while building this deal.
+UNPRINTABLE = dict(QUOTE, address='x\n' * 400)
+
+def pages(buffer):
+    return len(pdfrw.PdfReader(fdata=buffer.getvalue()).pages)
+
+def test_generate_pdf_returns_none_on_layout_error():
+    assert generate_pdf(QUOTE, None).startswith(b'%PDF')
+    assert generate_pdf(UNPRINTABLE, None) is None
+
+def test_bulk_pdf_skips_failed_deals():
+    single = io.BytesIO()
+    generate_pdfs([QUOTE], single)
+    out = io.BytesIO()
+    generate_pdfs(iter([QUOTE, UNPRINTABLE, {'quotes': {}}, dict(QUOTE, buyer='John Roe')]), out)
+    assert pages(out) == 2 * pages(single)
+
+def test_bulk_pdf_with_workers_matches_serial():
+    serial, parallel = io.BytesIO(), io.BytesIO()
+    deals = [QUOTE, UNPRINTABLE, QUOTE]
+    generate_pdfs(deals, serial)
+    generate_pdfs(deals, parallel, workers=2)
+    assert pages(parallel) == pages(serial)
+
+def test_bulk_zip_skips_failed_deals():
+    out = io.BytesIO()
+    generate_pdfs([QUOTE, UNPRINTABLE, dict(QUOTE, buyer='John Roe')], out, mode='zip')
+    assert zipfile.ZipFile(out).namelist() == ['0001_Jane Doe.pdf', '0003_John Roe.pdf']
@@ -0,0 +1,84 @@
+import os, zlib
+import numpy as np
+import pytest
+from inventory import Inventory, _hash_index, _hashes, build_inventory
+
+FEED = "Stock #,VIN,N/U,Year,Make,Model,Miles,Cost\nA1,5N1AT2MV4JC812345,N,2018,Nissan,Rogue,12,\"$25,100.50\"\nA2,1HGCM82633A004352,U,,,Accord,88000,7000\nA3,,used,2015,Ford,F-150,101000,15000\n"
+
+def build(tmp_path, text):
+    feed = tmp_path / "feed.csv"
+    feed.write_text(text)
+    return build_inventory(str(feed), str(tmp_path / "idx"))
+
+def load(tmp_path):
+    return Inventory.load(str(tmp_path / "idx"))
+
+def test_lookup_by_stock_and_vin(tmp_path):
+    manifest = build(tmp_path, FEED)
+    inventory = load(tmp_path)
+    assert manifest["rows"] == len(inventory) == 3
+    rogue = inventory.by_stock(" a1 ")
+    assert (rogue.vin, rogue.newused, rogue.year, rogue.make, rogue.odometer, rogue.cost) == ("5N1AT2MV4JC812345", "New", "2018", "Nissan", 12, 25100.5)
+    # Year and make come from the VIN when the export leaves them blank.
+    accord = inventory.by_vin("1hgcm82633a004352")
+    assert (accord.stocknum, accord.newused, accord.year, accord.make) == ("A2", "Used", "2003", "HONDA")
+    assert inventory.lookup("A3").model == "F-150"
+    assert inventory.by_stock("A4") is None and inventory.by_vin("") is None and inventory.lookup("") is None
+
+def test_hashes_match_zlib():
+    keys = np.array([b"", b"A", b"A1", b"5N1AT2MV4JC812345", "HÖNDA".encode()])
+    assert _hashes(keys).tolist() == [zlib.crc32(key) for key in keys.tolist()]
+
+def test_hash_index_probes_like_a_sequential_insert():
+    rng = np.random.default_rng(0)
+    keys = np.array([str(value).encode() for value in rng.integers(0, 3000, 5000)] + [b""] * 10)
+    table = _hash_index(keys)
+    assert len(table) == 16384
+    mask = len(table) - 1
+    firsts = {}
+    for row, key in enumerate(keys.tolist()):
+        if key:
+            firsts.setdefault(key, row)
+    assert sorted(table[table >= 0].tolist()) == sorted(firsts.values())
+    for key, row in firsts.items():
+        slot = zlib.crc32(key) & mask
+        while table[slot] != row:
+            assert table[slot] != -1
+            slot = (slot + 1) & mask
+
+def test_repeated_stock_number_keeps_first_row(tmp_path):
+    build(tmp_path, "Stock,VIN,Model\nA1,,First\nA1,,Second\n")
+    assert load(tmp_path).by_stock("A1").model == "First"
+
+def test_rebuild_reuses_unchanged_columns(tmp_path):
+    build(tmp_path, FEED)
+    before = load(tmp_path)
+    # The same units in a different order with one new cost: only the cost column is written again.
+    lines = FEED.splitlines()
+    manifest = build(tmp_path, "\n".join([lines[0], lines[3], lines[1], lines[2].replace("7000", "6500")]) + "\n")
+    after = load(tmp_path)
+    assert manifest["changes"] == {"added": 0, "removed": 0, "changed": 1}
+    for name in ("stocknum.npy", "stocknum.index.npy", "vin.index.npy", "model.npy"):
+        assert os.path.samefile(os.path.join(before.path, name), os.path.join(after.path, name))
+    assert not os.path.samefile(os.path.join(before.path, "cost.npy"), os.path.join(after.path, "cost.npy"))
+    assert after.by_stock("A2").cost == 6500 and after.by_stock("A3").cost == 15000
+
+def test_rebuild_counts_added_and_removed_units(tmp_path):
+    build(tmp_path, FEED)
+    manifest = build(tmp_path, FEED.replace("A3,,", "B7,,") + "A4,,,,,,,\n")
+    assert manifest["changes"] == {"added": 2, "removed": 1, "changed": 0}
+    inventory = load(tmp_path)
+    assert inventory.by_stock("A3") is None
+    assert [inventory.by_stock(stock).stocknum for stock in ("A1", "A2", "B7", "A4")] == ["A1", "A2", "B7", "A4"]
+
+def test_previous_build_is_kept_until_the_next_swap(tmp_path):
+    build(tmp_path, FEED)
+    first = load(tmp_path).path
+    build(tmp_path, FEED.replace("7000", "6500"))
+    second = load(tmp_path).path
+    assert os.path.isdir(first)
+    build(tmp_path, FEED.replace("7000", "6000"))
+    assert not os.path.exists(first) and os.path.isdir(second)
+
+def test_missing_store_loads_as_none(tmp_path):
+    assert Inventory.load(str(tmp_path / "idx")) is None
@@ -0,0 +1,81 @@
+import math
+import numpy as np
+import pytest
+from money import round_half_up, to_cents, from_cents, format_cents, payment_cents
+from utils import balance_cents, calculate_balance, payment_grid, payment_grid_cents
+
+@pytest.mark.parametrize("amount, cents", [
+    (1.005, 101), (2.675, 268), (0.125, 13), (0.015, 2), (1.004, 100), (10.245, 1025), (123456.785, 12345679),
+    (-1.005, -101), (-2.675, -268), (-0.005, -1), (-0.004, 0), (0, 0), (None, 0),
+])
+def test_to_cents_rounds_half_up_away_from_zero(amount, cents):
+    assert to_cents(amount) == cents
+    assert isinstance(to_cents(amount), int)
+
+@pytest.mark.parametrize("cents, rounded", [(0.5, 1), (1.5, 2), (2.5, 3), (2.4999, 2), (-0.5, -1), (-2.5, -3), (-2.4999, -2)])
+def test_round_half_up(cents, rounded):
+    assert round_half_up(cents) == rounded
+
+def test_array_matches_scalar():
+    amounts = [1.005, 2.675, 0.125, -1.005, -0.005, 0.0, 19.995, -19.995, 1234.565]
+    cents = to_cents(amounts)
+    assert cents.dtype == np.int64
+    assert cents.tolist() == [to_cents(amount) for amount in amounts]
+    raw = np.array([0.5, 1.5, -0.5, -1.5, 2.4999])
+    assert round_half_up(raw).tolist() == [round_half_up(value) for value in raw.tolist()]
+
+@pytest.mark.parametrize("value", [math.nan, math.inf, -math.inf])
+def test_non_finite_raises_in_both_paths(value):
+    with pytest.raises(ValueError):
+        to_cents(value)
+    with pytest.raises(ValueError):
+        to_cents([1.0, value])
+    with pytest.raises(ValueError):
+        round_half_up(np.array([value]))
+
+def test_format_cents():
+    assert format_cents(101) == "1.01"
+    assert format_cents(-5) == "-0.05"
+    assert format_cents(123456789, grouping=True) == "1,234,567.89"
+    assert from_cents(to_cents(1.005)) == 1.01
+
+def test_payment_cents_array_matches_scalar():
+    principals = np.array([2500000, 1999999, 100, 0], dtype=np.int64)
+    rates = np.array([14.0, 0.0, 5.25, 9.9])
+    terms = np.array([72, 60, 36, 48])
+    expected = [payment_cents(int(p), float(r), int(t)) for p, r, t in zip(principals, rates, terms)]
+    assert payment_cents(principals, rates, terms).tolist() == expected
+    assert payment_cents(2500000, 0.0, 72) == round_half_up(2500000 / 72)
+
+def test_balance_stays_in_cents():
+    # 0.1 + 0.2 style drift cannot reach the balance.
+    assert balance_cents(10, 0, 0, 0, 0, 20, 0, 0) == 30
+    assert calculate_balance(0.1, 0, 0, 0, 0, 0.2, 0, 0) == 0.3
+
+def test_payment_grid_matches_cents_core():
+    grid = payment_grid(30000, [1000, 2000], [14.0, 5.5], [72, 36])
+    assert grid.tolist() == from_cents(payment_grid_cents(3000000, [100000, 200000], [14.0, 5.5], [72, 36])).tolist()
+    assert payment_grid(0, [1000], [14.0], [72]).tolist() == [[0.0]]
+
+def test_small_grid_fast_path_matches_vectorized(monkeypatch):
+    import utils
+    args = (31847.97, [0, 1000.005, 2500.5], [14.0, 0.0, 6.9], [36, 60, 84])
+    small = payment_grid(*args)
+    monkeypatch.setattr(utils, "SMALL_GRID_CELLS", 0)
+    assert payment_grid(*args).tolist() == small.tolist()
+
+@pytest.mark.parametrize("rates, terms", [([7.0], [36, 60]), ([7.0, 5.0], [36]), ([7.0] * 5, [36] * 5), ([7.0], [36] * 20)])
+def test_grid_rates_broadcast_against_terms(monkeypatch, rates, terms):
+    # One rate across several terms, or the reverse, fills every row on both paths.
+    import utils
+    small = payment_grid(30000, [1000, 2000], rates, terms)
+    assert small.shape == (max(len(rates), len(terms)), 2)
+    monkeypatch.setattr(utils, "SMALL_GRID_CELLS", 0)
+    assert payment_grid(30000, [1000, 2000], rates, terms).tolist() == small.tolist()
+
+@pytest.mark.parametrize("small_grid_cells", [0, 16])
+def test_grid_rejects_mismatched_rates_and_terms(monkeypatch, small_grid_cells):
+    import utils
+    monkeypatch.setattr(utils, "SMALL_GRID_CELLS", small_grid_cells)
+    with pytest.raises(ValueError):
+        payment_grid(30000, [1000], [7.0, 5.0], [36, 60, 72])
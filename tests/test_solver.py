@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from money import payment_cents, to_cents
+from solver import lease_max_market_value, lease_minimum_term, lease_required_down_payment, max_market_value, minimum_term, required_down_payment
+from utils import calculate_balance, calculate_taxes, lease_payments
+
+# Solutions are in dollars and payments round to the cent, so a solved input reproduces the target within a cent.
+CENT = 0.011
+RATES = [0.0, 3.9, 14.0]
+TERMS = [36, 60, 72]
+LEASE = dict(doc_fee=799.0, non_tax_fees=125.0, doc=0, rebate=500.0, trade_value=2000.0, trade_payoff=1500.0, discount=1000.0)
+
+def finance_payment(financed, rate, term):
+    return payment_cents(to_cents(financed), rate, term) / 100
+
+def lease_payment(market_value, down_payment, money_factor, term, residual):
+    return float(lease_payments(market_value, LEASE["doc_fee"], LEASE["non_tax_fees"], LEASE["doc"], [down_payment], LEASE["rebate"], [money_factor], [term], [residual], LEASE["trade_value"], LEASE["trade_payoff"], LEASE["discount"])[0])
+
+@pytest.mark.parametrize("rate", RATES)
+@pytest.mark.parametrize("term", TERMS)
+def test_required_down_payment_round_trip(rate, term):
+    down = float(required_down_payment(400, 32000, rate, term))
+    assert down > 0
+    assert finance_payment(32000 - down, rate, term) == pytest.approx(400, abs=CENT)
+
+def test_required_down_payment_is_zero_when_target_is_already_met():
+    downs = required_down_payment(2000, 32000, RATES, TERMS)
+    assert downs.tolist() == [0, 0, 0]
+
+@pytest.mark.parametrize("rate", RATES)
+def test_minimum_term_is_the_shortest_affordable_term(rate):
+    term = int(minimum_term(600, 32000, 3000, rate))
+    assert finance_payment(29000, rate, term) <= 600 + CENT
+    assert finance_payment(29000, rate, term - 1) > 600
+
+def test_minimum_term_zero_rate_divides_evenly():
+    assert minimum_term(500, 30000, 0, 0).tolist() == 60
+    assert minimum_term(500.01, 30000, 0, 0).tolist() == 60
+
+def test_minimum_term_with_no_solution():
+    # 14% on $29,000 accrues $338.33 a month, so no term gets the payment down to $300; a zero target never does.
+    terms = minimum_term([300, 0, -10], 32000, 3000, 14.0)
+    assert np.isinf(terms).all()
+
+@pytest.mark.parametrize("state", ["NC", "SC", "ZZ"])
+@pytest.mark.parametrize("rate", RATES)
+def test_max_market_value_round_trip(state, rate):
+    # NC taxes a percentage of the price, SC a flat amount, and ZZ has no rule at all.
+    price = float(max_market_value(550, 2500, rate, 60, state, discount=1000, rebate=500, trade_value=4000, trade_payoff=6000, doc_fee=799, non_tax_fees=125))
+    taxes = calculate_taxes(state, price, 1000, 799, 4000)
+    balance = calculate_balance(price, 1000, 500, 4000, 6000, taxes, 799, 125)
+    assert finance_payment(balance - 2500, rate, 60) == pytest.approx(550, abs=CENT)
+
+def test_max_market_value_broadcasts_terms():
+    prices = max_market_value(550, 2500, 3.9, np.array(TERMS), "NC")
+    assert prices.shape == (3,)
+    assert np.all(np.diff(prices) > 0)
+
+@pytest.mark.parametrize("money_factor", [0.0, 0.00125, 0.0031])
+@pytest.mark.parametrize("term, residual", [(24, 0.65), (36, 0.58), (48, 0.5)])
+def test_lease_required_down_payment_round_trip(money_factor, term, residual):
+    down = float(lease_required_down_payment(350, 35000, money_factor=money_factor, term_months=term, residual_percentage=residual, **LEASE))
+    assert down > 0
+    assert lease_payment(35000, down, money_factor, term, residual) == pytest.approx(350, abs=CENT)
+
+def test_lease_required_down_payment_is_zero_when_target_is_already_met():
+    assert lease_required_down_payment(1500, 35000, money_factor=0.00125, term_months=36, residual_percentage=0.58, **LEASE) == 0
+
+@pytest.mark.parametrize("money_factor", [0.0, 0.00125, 0.0031])
+@pytest.mark.parametrize("term, residual", [(24, 0.65), (36, 0.58), (48, 0.5)])
+def test_lease_max_market_value_round_trip(money_factor, term, residual):
+    price = float(lease_max_market_value(450, down_payment=2000, money_factor=money_factor, term_months=term, residual_percentage=residual, **LEASE))
+    assert lease_payment(price, 2000, money_factor, term, residual) == pytest.approx(450, abs=CENT)
+
+@pytest.mark.parametrize("money_factor", [0.0, 0.00125])
+def test_lease_minimum_term_is_the_shortest_affordable_term(money_factor):
+    term = int(lease_minimum_term(400, 35000, down_payment=2000, money_factor=money_factor, residual_percentage=0.55, **LEASE))
+    assert lease_payment(35000, 2000, money_factor, term, 0.55) <= 400 + CENT
+    assert lease_payment(35000, 2000, money_factor, term - 1, 0.55) > 400
+
+def test_lease_minimum_term_with_no_solution():
+    # The rent charge alone is over the target, however long the lease runs.
+    terms = lease_minimum_term([100, 0], 35000, down_payment=2000, money_factor=0.0031, residual_percentage=0.55, **LEASE)
+    assert np.isinf(terms).all()
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from taxes import TaxTable, compile_rule
+
+TABLE = TaxTable(
+    {"NC": {"type": "percent", "rate": 0.03}, "SC": {"type": "capped", "rate": 0.05, "cap": 500}, "VA": {"type": "flat", "amount": 75},
+     "GA": {"type": "tiered", "brackets": [[0, 0.02], [10000, 0.04], [50000, 0]]}},
+    {"NC": {"Cabarrus County": {"type": "percent", "rate": 0.025}, "Wake": {"type": "flat", "amount": 100}}},
+    {"28027": {"type": "percent", "rate": 0.01}, "29715": {"type": "flat", "amount": 50}},
+)
+
+@pytest.mark.parametrize("spec, taxable, expected", [
+    ({"type": "percent", "rate": 0.03}, 30000, 900),
+    ({"type": "flat", "amount": 500}, 30000, 500),
+    ({"type": "flat", "amount": 500}, 0, 500),
+    ({"type": "capped", "rate": 0.05, "cap": 500}, 8000, 400),
+    ({"type": "capped", "rate": 0.05, "cap": 500}, 30000, 500),
+    ({"type": "capped", "rate": 0.05, "cap": 500, "minimum": 100}, 1000, 100),
+    ({"type": "tiered", "brackets": [[0, 0.02], [10000, 0.04], [50000, 0]]}, 5000, 100),
+    ({"type": "tiered", "brackets": [[10000, 0.04], [0, 0.02], [50000, 0]]}, 30000, 200 + 800),
+    ({"type": "tiered", "brackets": [[0, 0.02], [10000, 0.04], [50000, 0]]}, 90000, 200 + 1600),
+])
+def test_rule_types(spec, taxable, expected):
+    rule = compile_rule(spec)
+    assert rule(taxable) == pytest.approx(expected)
+    assert rule(np.array([taxable, taxable], dtype=float)).tolist() == pytest.approx([expected, expected])
+
+def test_invalid_rule():
+    with pytest.raises(ValueError, match="Invalid tax rule"):
+        compile_rule({"type": "percent"})
+    with pytest.raises(ValueError, match="Invalid tax rule"):
+        compile_rule({"type": "sliding"})
+
+@pytest.mark.parametrize("state, county, zipcode, expected", [
+    ("NC", "Cabarrus", "28027", 300),
+    ("NC", "Cabarrus", "28027-1234", 300),
+    ("NC", " cabarrus county ", None, 750),
+    ("NC", "Wake", "27601", 100),
+    ("nc ", "Mecklenburg", "28202", 900),
+    ("SC", "Cabarrus", None, 500),
+    ("SC", None, "29715", 50),
+    ("TX", None, None, 0),
+])
+def test_zip_then_county_then_state(state, county, zipcode, expected):
+    assert TABLE.tax(state, 30000, county, zipcode) == pytest.approx(expected)
+
+def test_tax_array_matches_tax_for_lists_and_arrays():
+    rng = np.random.default_rng(0)
+    n = 2000
+    states = rng.choice(["NC", "sc", " VA", "GA", "", "TX"], n).tolist()
+    counties = rng.choice(["Cabarrus", "CABARRUS COUNTY", "wake", "", "Other"], n).tolist()
+    zipcodes = rng.choice(["28027", "29715", "", "28027-0001", "12345"], n).tolist()
+    taxable = rng.uniform(0, 90000, n)
+    for county_column, zip_column in ((None, None), (counties, None), (None, zipcodes), (counties, zipcodes)):
+        expected = [TABLE.tax(s, x, None if county_column is None else county_column[i], None if zip_column is None else zip_column[i]) for i, (s, x) in enumerate(zip(states, taxable))]
+        as_arrays = [None if column is None else np.array(column) for column in (county_column, zip_column)]
+        assert TABLE.tax_array(states, taxable, county_column, zip_column) == pytest.approx(expected)
+        assert TABLE.tax_array(np.array(states), taxable, *as_arrays) == pytest.approx(expected)
+
+def test_tax_array_missing_values_and_empty():
+    assert TABLE.tax_array(["NC", "NC"], [30000, 30000], [None, "Wake"], [None, None]).tolist() == pytest.approx([900, 100])
+    assert TABLE.tax_array([], [], [], []).tolist() == []
+    assert TABLE.tax_array(np.array([], dtype=str), []).tolist() == []
@@ -1,91 +1,239 @@
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Spacer, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
-import logging, pdfrw
+import hashlib, threading
+import numpy as np
+from collections import OrderedDict, deque
+from functools import lru_cache
+from taxes import default_tax_table
+from money import to_cents, from_cents, format_cents, round_half_up, payment_cents
+
+# Grids up to this many cells are priced with scalar math; see payment_grid_cents.
+SMALL_GRID_CELLS = 16
+_DOCUMENT_EXPORTS = ("load_fi_template", "fill_fi_pdf", "generate_pdf", "generate_pdfs")
+
+def __getattr__(name):
+    # reportlab and pdfrw are only imported the first time a document function is used.
+    if name in _DOCUMENT_EXPORTS:
+        import documents
+        return getattr(documents, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def calculate_monthly_payment(principal, down_payment, annual_rate, term_months):
     if principal == 0:
         return 0
     else:
-        principal = principal - down_payment
-        monthly_rate = annual_rate / 100 / 12
-        if monthly_rate == 0:
-            payment = principal / term_months
-        else:
-            payment = principal * monthly_rate / (1 - (1 + monthly_rate) ** -term_months)
-        return "{:.2f}".format(payment)
+        financed = to_cents(principal) - to_cents(down_payment)
+        return format_cents(payment_cents(financed, annual_rate, term_months))
 
 def calculate_lease_payment(market_value, doc_fee, non_tax_fees, doc, down_payment, rebate, money_factor, term_months, residual_percentage, trade_value, trade_payoff, discount):
     if market_value == 0:
         return 0
     else:
+        market_value = to_cents(market_value)
         residual_value = market_value * residual_percentage
-        gross_cap_cost = market_value - discount + doc_fee + non_tax_fees + doc
-        cap_cost_reduction = down_payment + rebate + (trade_value - trade_payoff)
+        gross_cap_cost = market_value - to_cents(discount) + to_cents(doc_fee) + to_cents(non_tax_fees) + to_cents(doc)
+        cap_cost_reduction = to_cents(down_payment) + to_cents(rebate) + (to_cents(trade_value) - to_cents(trade_payoff))
         adjusted_cap_cost = gross_cap_cost - cap_cost_reduction
         monthly_depreciation = (adjusted_cap_cost - residual_value) / term_months
         monthly_rent_charge = (adjusted_cap_cost + residual_value) * money_factor
         monthly_tax = (monthly_depreciation + monthly_rent_charge) * 0.03
         total_monthly_lease_payment = monthly_depreciation + monthly_rent_charge + monthly_tax
-        return "{:.2f}".format(total_monthly_lease_payment)
+        return format_cents(round_half_up(total_monthly_lease_payment))
+
+def _grid_rows(annual_rates, terms):
+    # Rates and terms broadcast against each other, as in the vectorized path; any other mismatch raises ValueError.
+    return np.broadcast_shapes((len(annual_rates),), (len(terms),))[0]
+
+def payment_grid_cents(principal_cents, down_payment_cents, annual_rates, terms):
+    rows = _grid_rows(annual_rates, terms)
+    if rows * len(down_payment_cents) <= SMALL_GRID_CELLS:
+        # A desk-sized grid is quicker priced cell by cell than through NumPy's per-call overhead; the results match.
+        annual_rates = list(annual_rates) if len(annual_rates) == rows else list(annual_rates) * rows
+        terms = list(terms) if len(terms) == rows else list(terms) * rows
+        cells = [[payment_cents(principal_cents - int(down), float(rate), float(term)) if principal_cents else 0 for down in down_payment_cents] for rate, term in zip(annual_rates, terms)]
+        return np.array(cells, dtype=np.int64).reshape(rows, len(down_payment_cents))
+    financed = principal_cents - np.asarray(down_payment_cents, dtype=np.int64)[None, :]
+    payments = payment_cents(financed, np.asarray(annual_rates, dtype=float)[:, None], np.asarray(terms, dtype=float)[:, None])
+    if principal_cents == 0:
+        payments = np.zeros_like(payments)
+    return payments
+
+def payment_grid(principal, down_payments, annual_rates, terms):
+    small = _grid_rows(annual_rates, terms) * len(down_payments) <= SMALL_GRID_CELLS
+    down_payments = [to_cents(down) for down in down_payments] if small else to_cents(down_payments)
+    return from_cents(payment_grid_cents(to_cents(principal), down_payments, annual_rates, terms))
+
+def lease_payments_cents(market_value, doc_fee, non_tax_fees, doc, down_payments, rebate, money_factors, terms, residual_percentages, trade_value, trade_payoff, discount):
+    # Elementwise over down_payments, money_factors, terms and residual_percentages, which broadcast against each other.
+    money_factors = np.asarray(money_factors, dtype=float)
+    terms = np.asarray(terms, dtype=float)
+    residual_values = market_value * np.asarray(residual_percentages, dtype=float)
+    gross_cap_cost = market_value - discount + doc_fee + non_tax_fees + doc
+    cap_cost_reduction = np.asarray(down_payments, dtype=np.int64) + rebate + (trade_value - trade_payoff)
+    adjusted_cap_cost = gross_cap_cost - cap_cost_reduction
+    monthly_depreciation = (adjusted_cap_cost - residual_values) / terms
+    monthly_rent_charge = (adjusted_cap_cost + residual_values) * money_factors
+    monthly_tax = (monthly_depreciation + monthly_rent_charge) * 0.03
+    payments = round_half_up(monthly_depreciation + monthly_rent_charge + monthly_tax)
+    if market_value == 0:
+        payments = np.zeros_like(payments)
+    return payments
+
+def lease_payments(market_value, doc_fee, non_tax_fees, doc, down_payments, rebate, money_factors, terms, residual_percentages, trade_value, trade_payoff, discount):
+    return from_cents(lease_payments_cents(
+        to_cents(market_value), to_cents(doc_fee), to_cents(non_tax_fees), to_cents(doc), to_cents(np.asarray(down_payments, dtype=float)), to_cents(rebate),
+        money_factors, terms, residual_percentages, to_cents(trade_value), to_cents(trade_payoff), to_cents(discount),
+    ))
+
+def lease_payment_grid_cents(market_value, doc_fee, non_tax_fees, doc, down_payments, rebate, money_factors, terms, residual_percentages, trade_value, trade_payoff, discount):
+    return lease_payments_cents(
+        market_value, doc_fee, non_tax_fees, doc, np.asarray(down_payments, dtype=np.int64)[None, :], rebate, np.asarray(money_factors, dtype=float)[:, None],
+        np.asarray(terms, dtype=float)[:, None], np.asarray(residual_percentages, dtype=float)[:, None], trade_value, trade_payoff, discount,
+    )
+
+def lease_payment_grid(market_value, doc_fee, non_tax_fees, doc, down_payments, rebate, money_factors, terms, residual_percentages, trade_value, trade_payoff, discount):
+    return from_cents(lease_payment_grid_cents(
+        to_cents(market_value), to_cents(doc_fee), to_cents(non_tax_fees), to_cents(doc), to_cents(down_payments), to_cents(rebate),
+        money_factors, terms, residual_percentages, to_cents(trade_value), to_cents(trade_payoff), to_cents(discount),
+    ))
+
+# The *_cents functions take and return integer cents; the dollar versions convert once on the way in and once on
+# the way out. Tax rules are written in dollars, so the taxable amount crosses over only for the rule itself.
+def balance_cents(market_value, discount, rebate, trade_value, trade_payoff, taxes, doc_fee, non_tax_fees):
+    return market_value - discount - rebate - trade_value + trade_payoff + taxes + doc_fee + non_tax_fees
 
 def calculate_balance(market_value, discount, rebate, trade_value, trade_payoff, taxes, doc_fee, non_tax_fees):
-    market_value = market_value or 0
-    discount = discount or 0
-    rebate = rebate or 0
-    trade_value = trade_value or 0
-    trade_payoff = trade_payoff or 0
-    taxes = taxes or 0
-    doc_fee = doc_fee or 0
-    non_tax_fees = non_tax_fees or 0
-    balance = market_value - discount - rebate - trade_value + trade_payoff + taxes + doc_fee + non_tax_fees
-    return balance
-
-def calculate_taxes(state, market_value, discount, doc_fee, trade_value):
-    market_value = market_value or 0
-    discount = discount or 0
-    doc_fee = doc_fee or 0
-    trade_value = trade_value or 0
-    taxable_amount = market_value - discount - trade_value + doc_fee
-    if taxable_amount < 0:
-        taxable_amount = 0
-    if state.lower() == "nc":
-        tax = taxable_amount * 0.03
-    elif state.lower() == "sc":
-        tax = 500.00
-    elif state.lower() == "va":
-        tax = taxable_amount * 0.0415
-    else:
-        tax = 0.00
-    return max(tax, 0)
-
-def fill_fi_pdf(in_path, out_path, data):
-    pdf = pdfrw.PdfReader(in_path)
-    for page in pdf.pages:
-        annotations = page['/Annots']
-        if annotations is None:
-            continue
-
-        for annotation in annotations:
-            if annotation['/Subtype'] == '/Widget' and '/T' in annotation and annotation['/T']:
-                key = annotation['/T'].to_unicode()
-                if key in data:
-                    value = data[key]
-                    if isinstance(value, bool):  # Handle checkboxes
-                        if value:
-                            annotation.update(pdfrw.PdfDict(V=pdfrw.PdfName('Yes'), AS=pdfrw.PdfName('Yes')))
-                        else:
-                            annotation.update(pdfrw.PdfDict(V=pdfrw.PdfName('Off'), AS=pdfrw.PdfName('Off')))
-                    else:  # Handle text fields
-                        if isinstance(value, (float, int)):  # Convert numbers to strings
-                            value = str(value)
-                        pdfstr = pdfrw.objects.pdfstring.PdfString.encode(value)
-                        annotation.update(pdfrw.PdfDict(V=pdfstr))
-
-    pdf.Root.AcroForm.update(
-        pdfrw.PdfDict(NeedAppearances=pdfrw.PdfObject('true')))
-    pdfrw.PdfWriter().write(out_path, pdf)
+    return from_cents(balance_cents(to_cents(market_value), to_cents(discount), to_cents(rebate), to_cents(trade_value), to_cents(trade_payoff), to_cents(taxes), to_cents(doc_fee), to_cents(non_tax_fees)))
+
+def taxes_cents(state, market_value, discount, doc_fee, trade_value, county=None, zipcode=None):
+    taxable_amount = max(market_value - discount - trade_value + doc_fee, 0)
+    return to_cents(default_tax_table().tax(state, from_cents(taxable_amount), county, zipcode))
+
+def taxes_cents_array(states, market_values, discounts, doc_fees, trade_values, counties=None, zipcodes=None):
+    taxable_amounts = np.maximum(market_values - discounts - trade_values + doc_fees, 0)
+    return to_cents(default_tax_table().tax_array(states, from_cents(taxable_amounts), counties, zipcodes))
+
+def calculate_taxes(state, market_value, discount, doc_fee, trade_value, county=None, zipcode=None):
+    return from_cents(taxes_cents(state, to_cents(market_value), to_cents(discount), to_cents(doc_fee), to_cents(trade_value), county, zipcode))
+
+def calculate_taxes_array(states, market_values, discounts, doc_fees, trade_values, counties=None, zipcodes=None):
+    return from_cents(taxes_cents_array(states, to_cents(market_values), to_cents(discounts), to_cents(doc_fees), to_cents(trade_values), counties, zipcodes))
+
+# Deal-level entry points: anything with the Deal attributes (see models.py) can be priced without unpacking it first.
+# Deal fields are dollars, so the conversion to cents happens here.
+def deal_taxes_cents(deal):
+    return taxes_cents(deal.state, to_cents(deal.market_value), to_cents(deal.discount), to_cents(deal.doc_fee), to_cents(deal.trade_value), deal.county, deal.zipcode)
+
+def deal_balance_cents(deal, taxes=None):
+    taxes = to_cents(deal.taxes) if taxes is None else taxes
+    return balance_cents(to_cents(deal.market_value), to_cents(deal.discount), to_cents(deal.rebate), to_cents(deal.trade_value), to_cents(deal.trade_payoff), taxes, to_cents(deal.doc_fee), to_cents(deal.non_tax_fees))
+
+def deal_payment_grid_cents(deal, grid, balance):
+    if deal.lease:
+        return lease_payment_grid_cents(
+            to_cents(deal.market_value), to_cents(deal.doc_fee), to_cents(deal.non_tax_fees), 0, to_cents(grid.down_payments), 0,
+            grid.rates, grid.terms, grid.residuals, to_cents(deal.trade_value), to_cents(deal.trade_payoff), to_cents(deal.discount),
+        )
+    return payment_grid_cents(balance, to_cents(grid.down_payments), grid.rates, grid.terms)
+
+def deal_taxes(deal):
+    return from_cents(deal_taxes_cents(deal))
+
+def deal_balance(deal):
+    return from_cents(deal_balance_cents(deal))
+
+def deal_payment_grid(deal, grid, balance):
+    return from_cents(deal_payment_grid_cents(deal, grid, to_cents(balance)))
+
+class QuoteCache:
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        value = compute()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+quote_cache = QuoteCache()
+
+def _fingerprint_value(value):
+    if value is None:
+        return 0.0
+    if isinstance(value, str):
+        return value.strip().lower()
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(_fingerprint_value(v) for v in value)
+    return float(value)
+
+def deal_fingerprint(kind, *inputs):
+    normalized = (kind,) + tuple(_fingerprint_value(v) for v in inputs)
+    return hashlib.blake2b(repr(normalized).encode(), digest_size=16).digest()
+
+def cached_taxes(state, market_value, discount, doc_fee, trade_value, county=None, zipcode=None):
+    key = deal_fingerprint("taxes", state, market_value, discount, doc_fee, trade_value, county or "", zipcode or "")
+    return quote_cache.get_or_compute(key, lambda: calculate_taxes(state, market_value, discount, doc_fee, trade_value, county, zipcode))
+
+def cached_balance(market_value, discount, rebate, trade_value, trade_payoff, taxes, doc_fee, non_tax_fees):
+    key = deal_fingerprint("balance", market_value, discount, rebate, trade_value, trade_payoff, taxes, doc_fee, non_tax_fees)
+    return quote_cache.get_or_compute(key, lambda: calculate_balance(market_value, discount, rebate, trade_value, trade_payoff, taxes, doc_fee, non_tax_fees))
+
+def _read_only(payments):
+    payments.setflags(write=False)
+    return payments
+
+def cached_payment_grid(principal, down_payments, annual_rates, terms):
+    key = deal_fingerprint("payment_grid", principal, down_payments, annual_rates, terms)
+    return quote_cache.get_or_compute(key, lambda: _read_only(payment_grid(principal, down_payments, annual_rates, terms)))
+
+def cached_lease_payment_grid(market_value, doc_fee, non_tax_fees, doc, down_payments, rebate, money_factors, terms, residual_percentages, trade_value, trade_payoff, discount):
+    key = deal_fingerprint("lease_payment_grid", market_value, doc_fee, non_tax_fees, doc, down_payments, rebate, money_factors, terms, residual_percentages, trade_value, trade_payoff, discount)
+    return quote_cache.get_or_compute(key, lambda: _read_only(lease_payment_grid(market_value, doc_fee, non_tax_fees, doc, down_payments, rebate, money_factors, terms, residual_percentages, trade_value, trade_payoff, discount)))
+
+def cached_deal_taxes(deal):
+    return cached_taxes(deal.state, deal.market_value, deal.discount, deal.doc_fee, deal.trade_value, deal.county, deal.zipcode)
+
+def cached_deal_balance(deal):
+    return cached_balance(deal.market_value, deal.discount, deal.rebate, deal.trade_value, deal.trade_payoff, deal.taxes, deal.doc_fee, deal.non_tax_fees)
+
+def cached_deal_payment_grid(deal, grid, balance):
+    if deal.lease:
+        return cached_lease_payment_grid(deal.market_value, deal.doc_fee, deal.non_tax_fees, 0, grid.down_payments, 0, grid.rates, grid.terms, grid.residuals, deal.trade_value, deal.trade_payoff, deal.discount)
+    return cached_payment_grid(balance, grid.down_payments, grid.rates, grid.terms)
+
+def ordered_imap(executor, fn, iterable, window):
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+@lru_cache(maxsize=None)
+def read_static_asset(path):
+    with open(path) as f:
+        return f.read()
 
 def modify_stocknum(stocknum):
     if stocknum[-1].isdigit():
@@ -95,197 +243,6 @@ def modify_stocknum(stocknum):
         new_last_char = chr(ord(last_char) + 1)
         return stocknum[:-1] + new_last_char
     
-def generate_pdf(data, filename='quote.pdf'):
-    try:
-        doc = SimpleDocTemplate(filename, pagesize=letter, topMargin=50, leftMargin=36, rightMargin=36)
-        elements = []
-        styles = getSampleStyleSheet()
-        header_data_left = [["MODERN AUTOMOTIVE"]]
-        header_table_left = Table(header_data_left, colWidths=[200])
-        header_table_left.setStyle(TableStyle([
-            ('SPAN', (0, 0), (-1, -1)),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 14),
-        ]))
-        header_data_right = [
-            ["Date:", data.get('date', '')],
-            ["Sales Person:", data.get('salesperson', '')],
-            ["Manager:", data.get('manager', '')]
-        ]
-        header_table_right = Table(header_data_right, colWidths=[80, 150])
-        header_table_right.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ]))
-        spacer = Spacer(width=100, height=0)
-        combined_header_data = [
-            [header_table_left, spacer, header_table_right]
-        ]
-        combined_header_table = Table(combined_header_data, colWidths=[200, 100, 260])
-        combined_header_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'TOP')
-        ]))
-        elements.append(combined_header_table)
-        elements.append(Spacer(1, 8))
-        details_data = [
-            ["Customer", data.get('buyer', ''), "", ""],
-            ["", data.get('address', ''), "", ""],
-            ["", f"{data.get('city', '')}, {data.get('state', '')} {data.get('zip', '')}", "", ""],
-            ["Email", data.get('email_add', ''), "Phone", data.get('cell_phone', '')]
-        ]
-        details_table = Table(details_data, colWidths=[70, 230, 55, 160])
-        details_table.setStyle(TableStyle([
-            ('GRID', (0, 0), (-1, -1), 1, colors.white),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.white),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica'),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ]))
-        elements.append(details_table)
-        elements.append(Spacer(1, 20))
-        selection_data = [
-            ["VEHICLE", "", "", "", "", ""],
-            ["YEAR", "MAKE", "MODEL", "STOCK NO.", "VIN", "MILES"],
-            [
-                data.get('year', ''),
-                data.get('make', ''),
-                f"{data.get('model', '')} {data.get('trim', '')}".strip(),
-                data.get('stock_no', ''),
-                data.get('vin', ''),
-                data.get('miles', '')
-            ]
-        ]
-        if data.get('trade_vin'):
-            selection_data.append(["TRADE-IN", "", "", "", ""])
-            selection_data.append(["YEAR", "MAKE", "MODEL", "", "VIN", "MILES"])
-            selection_data.append([
-                data.get('trade_year', ''),
-                data.get('trade_make', ''),
-                f"{data.get('trade_model', '')} {data.get('trade_trim', '')}".strip(),
-                "",
-                data.get('trade_vin', ''),
-                data.get('trade_miles', '')
-            ])
-        if data.get('trade_vin_2'):
-            selection_data.append(["TRADE-IN 2", "", "", "", ""])
-            selection_data.append(["YEAR", "MAKE", "MODEL", "", "VIN", "MILES"])
-            selection_data.append([
-                data.get('trade_year_2', ''),
-                data.get('trade_make_2', ''),
-                f"{data.get('trade_model_2', '')} {data.get('trade_trim_2', '')}".strip(),
-                "",
-                data.get('trade_vin_2', ''),
-                data.get('trade_miles_2', '')
-            ])
-        selection_table = Table(selection_data, colWidths=[55, 65, 100, 80, 135, 80])
-        selection_table.setStyle(TableStyle([
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.black),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER')
-        ]))
-        if data.get('trade_vin'):
-            selection_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 3), (-1, 3), colors.black),
-                ('TEXTCOLOR', (0, 3), (-1, 3), colors.white),
-                ('FONTNAME', (0, 3), (-1, 3), 'Helvetica-Bold')
-            ]))
-        if data.get('trade_vin_2'):
-            selection_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 6), (-1, 6), colors.black),
-                ('TEXTCOLOR', (0, 6), (-1, 6), colors.white),
-                ('FONTNAME', (0, 6), (-1, 6), 'Helvetica-Bold')
-            ]))
-        elements.append(selection_table)
-        elements.append(Spacer(1, 20))
-        grid_data = [["Term"] + [f"${dp:.2f}" for dp in data['quotes'][list(data['quotes'].keys())[0]].keys()]]
-        for term, payments in data['quotes'].items():
-            row = [term]
-            for dp, payment in payments.items():
-                row.append(f"${payment:.2f}")
-            grid_data.append(row)
-        market_value = data.get('sale_price', 0)
-        savings = data.get('rebate', 0) + data.get('discount', 0)
-        sales_price = market_value - savings
-        breakdown_data = [
-            ["Market Value", f"${market_value:.2f}"] if market_value != 0 else None,
-            ["Savings", f"${savings:.2f}"] if savings != 0 else None,
-            ["Sales Price", f"${sales_price:.2f}"] if market_value != 0 else None,
-            ["Trade Value", f"${data.get('trade_value', 0):.2f}"] if data.get('trade_value', 0) != 0 else None,
-            ["Trade Payoff", f"${data.get('trade_payoff', 0):.2f}"] if data.get('trade_payoff', 0) != 0 else None,
-            ["Doc Fee", f"${data.get('doc_fee', 0):.2f}"] if data.get('doc_fee', 0) != 0 else None,
-            ["Sales Tax", f"${data.get('sales_tax', 0):.2f}"] if data.get('sales_tax', 0) != 0 else None,
-            ["Non Tax Fees", f"${data.get('non_tax_fees', 0):.2f}"] if data.get('non_tax_fees', 0) != 0 else None,
-            ["Balance", f"${data.get('balance', 0):.2f}"] if data.get('balance', 0) != 0 else None,
-        ]
-        breakdown_data = [row for row in breakdown_data if row is not None]
-        breakdown_table = Table(breakdown_data, colWidths=[100, 80])
-        breakdown_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP')
-        ]))
-        for row_idx in range(len(breakdown_data)):
-            breakdown_table.setStyle(TableStyle([
-                ('LINEBELOW', (1, row_idx), (1, row_idx), 1, colors.black)
-            ]))
-        elements.append(Spacer(1, 30))
-        grid_table = Table(grid_data, colWidths=[75] + [75]*len(data['quotes'][list(data['quotes'].keys())[0]].keys()))
-        grid_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.black),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-BoldOblique'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica-Oblique'),
-            ('FONTSIZE', (0, 1), (-1, -1), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-        combined_data = [
-            [grid_table, spacer, breakdown_table]
-        ]
-        combined_table = Table(combined_data, colWidths=[300, 20, 220], rowHeights=None, hAlign='LEFT')
-        combined_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'TOP')
-        ]))
-        elements.append(combined_table)
-        elements.append(Spacer(1, 20))
-        disclaimer_line = Table([["* A.P.R Subject to equity and credit requirements."]], colWidths=[470])
-        disclaimer_line.setStyle(TableStyle([
-            ('SPAN', (0, 0), (-1, -1)),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ]))
-        elements.append(disclaimer_line)
-        elements.append(Spacer(1, 20))
-        signature_data = [
-            ["Customer Approval: ", "_________________________ ", "Management Approval: ", "_________________________"]
-        ]
-        signature_table = Table(signature_data, colWidths=[150, 100, 150, 100])
-        signature_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-        ]))
-        elements.append(signature_table)
-        paragraph_text = "By signing this authorization form, you certify that the above personal information is correct and accurate, and authorize the release of credit and employment information. By signing above, I provide to the dealership and its affiliates consent to communicate with me about my vehicle or any future vehicles using electronic, verbal and written communications including but not limited to email, text messaging, SMS, phone calls and direct mail. Terms and Conditions subject to credit approval. For Information Only. This is not an offer or contract for sale."
-        paragraph_style = styles["Normal"]
-        paragraph_style.fontSize = 6
-        paragraph = Paragraph(paragraph_text, paragraph_style)
-        elements.append(paragraph)
-        doc.build(elements)
-        return filename
-    except Exception as e:
-        logging.error(f"Failed to generate PDF: {e}")
-        return None
-    
 dealer_names = {
     "MODERN NISSAN OF CONCORD, LLC": "967 CONCORD PKWY S, CONCORD, NC 28027",
     "MODERN CHEVROLET WINSTON": "5955 UNIVERSITY PKWY, WINSTON-SALEM, NC 27105",
@@ -0,0 +1,112 @@
+import argparse, csv, os, sys
+import numpy as np
+from collections import namedtuple
+from datetime import date
+from functools import lru_cache
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+WMI_PATH = os.path.join(DATA_DIR, "wmi.csv")
+
+VinInfo = namedtuple("VinInfo", "vin wmi make year check_digit_ok")
+
+ALNUM = b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+TRANSLITERATION = dict(zip(b"0123456789ABCDEFGHJKLMNPRSTUVWXYZ", (0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 1, 2, 3, 4, 5, 6, 7, 8, 1, 2, 3, 4, 5, 7, 9, 2, 3, 4, 5, 6, 7, 8, 9)))
+WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+# Position 10 cycles through these every 30 years from 1980. A letter in position 7 marks the 2010 cycle.
+YEAR_CODES = b"ABCDEFGHJKLMNPRSTVWXY123456789"
+
+# 256-entry byte tables, so a batch of VINs decodes with fancy indexing instead of a loop over characters.
+_VALUES = np.full(256, -1, dtype=np.int64)
+_VALUES[list(TRANSLITERATION)] = list(TRANSLITERATION.values())
+_YEAR_OFFSETS = np.full(256, -1, dtype=np.int64)
+_YEAR_OFFSETS[list(YEAR_CODES)] = np.arange(len(YEAR_CODES))
+_ALNUM_CODES = np.zeros(256, dtype=np.int64)
+_ALNUM_CODES[list(ALNUM)] = np.arange(len(ALNUM))
+_WEIGHTS = np.array(WEIGHTS)
+
+def _wmi_code(wmi):
+    return (_ALNUM_CODES[wmi[0]] * 36 + _ALNUM_CODES[wmi[1]]) * 36 + _ALNUM_CODES[wmi[2]]
+
+@lru_cache(maxsize=1)
+def wmi_table(path=WMI_PATH):
+    # Direct-address table over every three-character WMI (36**3 slots, about 90 KB); slot value is an index into
+    # makes, with 0 meaning unknown.
+    makes = [""]
+    table = np.zeros(36 ** 3, dtype=np.uint16)
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            make = row["make"].strip().upper()
+            if make not in makes:
+                makes.append(make)
+            table[_wmi_code(row["wmi"].strip().upper().encode())] = makes.index(make)
+    return table, makes
+
+def check_digit(vin):
+    total = sum(TRANSLITERATION[char] * weight for char, weight in zip(vin.upper().encode(), WEIGHTS))
+    return "X" if total % 11 == 10 else str(total % 11)
+
+def model_year(vin, this_year=None):
+    vin = vin.upper()
+    offset = YEAR_CODES.find(vin[9].encode())
+    if offset == -1:
+        return None
+    year = (2010 if vin[6].isalpha() else 1980) + offset
+    return year - 30 if year > (this_year or date.today().year) + 1 else year
+
+@lru_cache(maxsize=4096)
+def decode_vin(vin):
+    # None unless vin is 17 characters from the VIN alphabet (no I, O or Q).
+    vin = str(vin or "").strip().upper()
+    if len(vin) != 17 or any(char not in TRANSLITERATION for char in vin.encode()):
+        return None
+    table, makes = wmi_table()
+    return VinInfo(vin, vin[:3], makes[table[_wmi_code(vin.encode())]], model_year(vin), vin[8] == check_digit(vin))
+
+def decode_vins(vins, this_year=None):
+    # Columns parallel to vins. Rows that are not 17 VIN characters get valid False, year 0 and make "".
+    # Non-ASCII characters encode as "?", which is not a VIN character, so those rows simply come out invalid.
+    vins = [str(vin or "").strip().upper() for vin in vins]
+    raw = np.array([vin.encode("ascii", "replace") for vin in vins], dtype="S18")
+    codes = raw.view(np.uint8).reshape(-1, 18)
+    chars = codes[:, :17]
+    values = _VALUES[chars]
+    valid = (codes[:, 17] == 0) & (values >= 0).all(axis=1)
+    remainder = (np.where(values >= 0, values, 0) @ _WEIGHTS) % 11
+    expected = np.where(remainder == 10, ord("X"), ord("0") + remainder)
+    offsets = _YEAR_OFFSETS[chars[:, 9]]
+    year = np.where(chars[:, 6] >= ord("A"), 2010, 1980) + offsets
+    year = np.where(year > (this_year or date.today().year) + 1, year - 30, year)
+    table, makes = wmi_table()
+    make_ids = table[_wmi_code(chars[:, :3].T)]
+    return {
+        "vin": np.array(vins, dtype=str),
+        "valid": valid,
+        "check_digit_ok": valid & (chars[:, 8] == expected),
+        "year": np.where(valid & (offsets >= 0), year, 0),
+        "make": np.array(makes, dtype=object)[np.where(valid, make_ids, 0)],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode VINs offline: check digit, model year and make.")
+    parser.add_argument("input", help="file with one VIN per line (or a CSV with a vin column), or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output CSV, or - for stdout")
+    args = parser.parse_args(argv)
+    in_file = sys.stdin if args.input == "-" else open(args.input, newline="")
+    out_file = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    try:
+        lines = [line.strip() for line in in_file if line.strip()]
+        if lines and "vin" in lines[0].lower().split(","):
+            lines = [row.get("vin") or row.get("VIN") or "" for row in csv.DictReader(lines)]
+        decoded = decode_vins(lines)
+        writer = csv.writer(out_file)
+        writer.writerow(["vin", "valid", "check_digit_ok", "year", "make"])
+        writer.writerows(zip(decoded["vin"], decoded["valid"].astype(int), decoded["check_digit_ok"].astype(int), decoded["year"], decoded["make"]))
+    finally:
+        if in_file is not sys.stdin:
+            in_file.close()
+        if out_file is not sys.stdout:
+            out_file.close()
+    print(f"Decoded {len(lines)} VINs", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import argparse, csv, json, os, sys
+import numpy as np
+from collections import namedtuple
+from functools import lru_cache
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+ZIP_PREFIXES_PATH = os.path.join(DATA_DIR, "zip_prefixes.csv")
+ZIP_COUNTIES_PATH = os.path.join(DATA_DIR, "zip_counties.csv")
+DEFAULT_ZIP_INDEX_PATH = os.path.join(DATA_DIR, "zip_index.npy")
+ZIP_INDEX_PATH = os.environ.get("QUOTE_ZIP_INDEX", DEFAULT_ZIP_INDEX_PATH)
+ZIP_COUNT = 100_000
+
+ZipInfo = namedtuple("ZipInfo", "state county jurisdiction")
+
+def _names_path(index_path):
+    return os.path.splitext(index_path)[0] + ".json"
+
+def build_zip_index(counties_path=ZIP_COUNTIES_PATH, out_path=ZIP_INDEX_PATH, prefixes_path=ZIP_PREFIXES_PATH):
+    # Row i of the table is (state id, county id) for ZIP i, with id 0 meaning unknown: a 400 KB direct-address table.
+    names = {"states": [""], "counties": [""]}
+    ids = {"states": {"": 0}, "counties": {"": 0}}
+
+    def intern(kind, name):
+        name = name.strip()
+        if name not in ids[kind]:
+            ids[kind][name] = len(names[kind])
+            names[kind].append(name)
+        return ids[kind][name]
+
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    table = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint16, shape=(ZIP_COUNT, 2))
+    table[:] = 0
+    if prefixes_path:
+        with open(prefixes_path, newline="") as f:
+            for row in csv.DictReader(f):
+                table[int(row["start"]) * 100:(int(row["end"]) + 1) * 100, 0] = intern("states", row["state"].upper())
+    with open(counties_path, newline="") as f:
+        for row in csv.DictReader(f):
+            zipcode = row["zip"].strip()[:5]
+            if zipcode.isdigit():
+                table[int(zipcode)] = (intern("states", row["state"].upper()), intern("counties", row.get("county") or ""))
+    table.flush()
+    del table
+    names_tmp_path = f"{_names_path(out_path)}.{os.getpid()}.tmp"
+    with open(names_tmp_path, "w") as f:
+        json.dump(names, f)
+    os.replace(names_tmp_path, _names_path(out_path))
+    os.replace(tmp_path, out_path)
+    return out_path
+
+class ZipIndex:
+    def __init__(self, table, states, counties):
+        self.table = table
+        self.states = states
+        self.counties = counties
+
+    @classmethod
+    def load(cls, path=ZIP_INDEX_PATH):
+        # The table is memory-mapped read-only, so every worker process shares the same page-cache copy.
+        with open(_names_path(path)) as f:
+            names = json.load(f)
+        return cls(np.load(path, mmap_mode="r"), names["states"], names["counties"])
+
+    def lookup(self, zipcode):
+        zipcode = str(zipcode or "").strip()[:5]
+        if len(zipcode) != 5 or not zipcode.isdigit():
+            return None
+        state_id, county_id = self.table[int(zipcode)].tolist()
+        if not state_id:
+            return None
+        state, county = self.states[state_id], self.counties[county_id]
+        return ZipInfo(state, county, f"{state}/{county}" if county else state)
+
+    def lookup_array(self, zipcodes):
+        zipcodes = np.asarray(zipcodes, dtype=np.int64)
+        rows = self.table[np.clip(zipcodes, 0, ZIP_COUNT - 1)]
+        rows[(zipcodes < 0) | (zipcodes >= ZIP_COUNT)] = 0
+        return np.array(self.states, dtype=object)[rows[:, 0]], np.array(self.counties, dtype=object)[rows[:, 1]]
+
+def _stale(path):
+    if not os.path.exists(path) or not os.path.exists(_names_path(path)):
+        return True
+    built = os.path.getmtime(path)
+    return any(os.path.getmtime(source) > built for source in (ZIP_COUNTIES_PATH, ZIP_PREFIXES_PATH))
+
+@lru_cache(maxsize=None)
+def default_zip_index():
+    # Only the bundled seed index is rebuilt on demand; an index built from a full dataset is used as-is.
+    if ZIP_INDEX_PATH == DEFAULT_ZIP_INDEX_PATH and _stale(ZIP_INDEX_PATH):
+        build_zip_index()
+    return ZipIndex.load()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the ZIP to state/county index from a zip,state,county CSV.")
+    parser.add_argument("counties", nargs="?", default=ZIP_COUNTIES_PATH, help="CSV with zip, state and county columns")
+    parser.add_argument("-o", "--output", default=ZIP_INDEX_PATH, help="index file to write (.npy, with a .json of names beside it)")
+    parser.add_argument("--prefixes", default=ZIP_PREFIXES_PATH, help="CSV of 3-digit ZIP prefix ranges used to fill in states")
+    parser.add_argument("--no-prefixes", action="store_true", help="only index ZIPs listed in the counties CSV")
+    args = parser.parse_args(argv)
+    out_path = build_zip_index(args.counties, args.output, None if args.no_prefixes else args.prefixes)
+    print(f"Wrote {out_path}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()